@@ -1,30 +1,21 @@
 import os
-from flask import Flask, g
+from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import get_config
 from utils import db
+from utils.cache import cache
+from utils.json_provider import OrjsonProvider
 from routes import register_routes
 
 
-def get_db():
-    """Get database connection"""
-    if 'db' not in g:
-        g.db = db.get_connection(current_app.config)
-    return g.db
-
-
-def close_db(e=None):
-    """Close database connection"""
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
-
-
 def create_app(config_name='development'):
     """Create and configure the Flask application"""
     app = Flask(__name__)
     
+    # Serialize responses with orjson
+    app.json = OrjsonProvider(app)
+    
     # Load configuration
     app.config.from_object(get_config())
     
@@ -34,8 +25,11 @@ def create_app(config_name='development'):
     # Initialize JWT
     jwt = JWTManager(app)
     
-    # Register database connection handlers
-    app.teardown_appcontext(close_db)
+    # Initialize response cache
+    cache.init_app(app)
+    
+    # Return database connections to the pool; views check them out lazily
+    app.teardown_appcontext(db.close_db)
     
     # Create upload folder if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
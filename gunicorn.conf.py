@@ -0,0 +1,18 @@
+"""Gunicorn configuration
+
+Run with: gunicorn "app:create_app()"
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Threaded workers let one process overlap many requests that are waiting on
+# MySQL; the connection pool in utils.db is thread-safe. Keep
+# threads <= DB_POOL_SIZE + DB_MAX_OVERFLOW so no thread waits for a connection.
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Import the app once in the master so workers share the loaded code
+preload_app = True
@@ -1,7 +1,9 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from marshmallow import Schema, fields, validate, ValidationError
+from marshmallow import Schema, fields, validate
 from utils import db
+from utils.validation import json_body
+from utils.cache import cache, accounts_key, invalidate_reports
 import enum
 
 # Create blueprint
@@ -16,38 +18,62 @@ class AccountType(enum.Enum):
     INVESTMENT = "investment"
     OTHER = "other"
 
+_ACCOUNT_TYPE_BY_VALUE = {t.value: t for t in AccountType}
+
+# Updatable request fields mapped to their column names
+_UPDATABLE_COLUMNS = {
+    'name': 'name',
+    'account_type': 'type',
+    'currency': 'currency',
+    'description': 'description',
+    'institution': 'institution',
+}
+
 # Input validation schemas
 class AccountSchema(Schema):
     name = fields.String(required=True)
-    account_type = fields.String(required=True, validate=validate.OneOf([t.value for t in AccountType]))
+    account_type = fields.String(required=True, validate=validate.OneOf(_ACCOUNT_TYPE_BY_VALUE.keys()))
     balance = fields.Float()
     currency = fields.String(validate=validate.Length(equal=3))
     description = fields.String()
     institution = fields.String()
 
+# Schemas are stateless during load, so build them once and reuse them
+_ACCOUNT_SCHEMA = AccountSchema()
+
 # Route definitions
 @accounts_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_all_accounts():
     """Get all accounts for the current user"""
     current_user_id = get_jwt_identity()
-    conn = g.db
     
-    query = """
-        SELECT * FROM accounts 
-        WHERE user_id = %s AND is_active = 1
-        ORDER BY name
-    """
-    accounts = db.fetch_all(conn, query, (current_user_id,))
-    
-    return jsonify({"accounts": accounts}), 200
+    # Serve from cache until an account or transaction write invalidates it
+    cache_key = accounts_key(current_user_id)
+    accounts = cache.get(cache_key)
+    if accounts is None:
+        query = """
+            SELECT id, name, type, balance, currency, institution
+            FROM accounts 
+            WHERE user_id = %s AND is_active = 1
+            ORDER BY name
+        """
+        accounts = db.fetch_all(db.get_db(), query, (current_user_id,))
+        cache.set(cache_key, accounts)
+    
+    # Let clients revalidate with If-None-Match instead of re-downloading
+    response = jsonify({"accounts": accounts})
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
 
 @accounts_bp.route('/<int:account_id>', methods=['GET'])
 @jwt_required()
 def get_account(account_id):
     """Get a specific account by ID"""
     current_user_id = get_jwt_identity()
-    conn = g.db
+    conn = db.get_db()
     
     query = "SELECT * FROM accounts WHERE id = %s AND user_id = %s"
     account = db.fetch_one(conn, query, (account_id, current_user_id))
@@ -59,23 +85,11 @@ def get_account(account_id):
 
 @accounts_bp.route('/', methods=['POST'])
 @jwt_required()
-def create_account():
+@json_body(_ACCOUNT_SCHEMA)
+def create_account(data):
     """Create a new financial account"""
     current_user_id = get_jwt_identity()
-    conn = g.db
-    
-    # Validate input data
-    schema = AccountSchema()
-    try:
-        data = schema.load(request.json)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
-    # Map string account type to enum to validate
-    try:
-        AccountType(data['account_type'])
-    except ValueError:
-        return jsonify({"message": "Invalid account type"}), 400
+    conn = db.get_db()
     
     # Create new account
     try:
@@ -95,11 +109,13 @@ def create_account():
             True,
             current_user_id
         )
-        db.execute_with_commit(conn, query, params)
+        account_id = db.insert_with_commit(conn, query, params)
+        cache.delete(accounts_key(current_user_id))
+        invalidate_reports(current_user_id)
         
         # Get the newly created account
-        query = "SELECT * FROM accounts WHERE user_id = %s ORDER BY id DESC LIMIT 1"
-        account = db.fetch_one(conn, query, (current_user_id,))
+        query = "SELECT * FROM accounts WHERE id = %s"
+        account = db.fetch_one(conn, query, (account_id,))
         
         return jsonify({
             "message": "Account created successfully",
@@ -111,52 +127,33 @@ def create_account():
 
 @accounts_bp.route('/<int:account_id>', methods=['PUT'])
 @jwt_required()
-def update_account(account_id):
+@json_body(_ACCOUNT_SCHEMA, partial=True)
+def update_account(account_id, data):
     """Update an existing account"""
     current_user_id = get_jwt_identity()
-    conn = g.db
-    
-    # Check if account exists and belongs to user
-    check_query = "SELECT id FROM accounts WHERE id = %s AND user_id = %s"
-    account = db.fetch_one(conn, check_query, (account_id, current_user_id))
-    if not account:
-        return jsonify({"message": "Account not found"}), 404
-    
-    # Validate input data
-    schema = AccountSchema()
-    try:
-        data = schema.load(request.json, partial=True)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
-    # Validate account type if provided
-    if 'account_type' in data:
-        try:
-            AccountType(data['account_type'])
-        except ValueError:
-            return jsonify({"message": "Invalid account type"}), 400
+    conn = db.get_db()
     
     # Build update query dynamically based on provided fields
-    update_fields = []
-    params = []
-    for field in ['name', 'account_type', 'currency', 'description', 'institution']:
-        if field in data:
-            update_fields.append(f"{field if field != 'account_type' else 'type'} = %s")
-            params.append(data[field])
-    
-    if not update_fields:
+    fields_to_update = [field for field in _UPDATABLE_COLUMNS if field in data]
+    if not fields_to_update:
         return jsonify({"message": "No fields to update"}), 400
     
+    update_fields = [f"{_UPDATABLE_COLUMNS[field]} = %s" for field in fields_to_update]
+    params = [data[field] for field in fields_to_update]
+    
     # Add account_id and user_id to params
     params.extend([account_id, current_user_id])
     
-    # Update account
+    # Update account; the ownership check rides on the WHERE clause
     query = f"""
         UPDATE accounts 
         SET {', '.join(update_fields)}
         WHERE id = %s AND user_id = %s
     """
-    db.execute_with_commit(conn, query, params)
+    if not db.execute_with_commit(conn, query, params):
+        return jsonify({"message": "Account not found"}), 404
+    cache.delete(accounts_key(current_user_id))
+    invalidate_reports(current_user_id)
     
     # Get updated account
     query = "SELECT * FROM accounts WHERE id = %s"
@@ -172,7 +169,7 @@ def update_account(account_id):
 def delete_account(account_id):
     """Soft delete an account (mark as inactive)"""
     current_user_id = get_jwt_identity()
-    conn = g.db
+    conn = db.get_db()
     
     # Check if account exists and belongs to user
     check_query = "SELECT id FROM accounts WHERE id = %s AND user_id = %s"
@@ -183,5 +180,7 @@ def delete_account(account_id):
     # Soft delete (mark as inactive)
     query = "UPDATE accounts SET is_active = 0 WHERE id = %s AND user_id = %s"
     db.execute_with_commit(conn, query, (account_id, current_user_id))
+    cache.delete(accounts_key(current_user_id))
+    invalidate_reports(current_user_id)
     
     return jsonify({"message": "Account deleted successfully"}), 200 
\ No newline at end of file
@@ -1,12 +1,14 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, jsonify, current_app
 from flask_jwt_extended import (
     create_access_token, create_refresh_token, 
     jwt_required, get_jwt_identity
 )
-from werkzeug.security import generate_password_hash, check_password_hash
-from marshmallow import Schema, fields, validate, ValidationError
+from marshmallow import Schema, fields, validate
 from email_validator import validate_email, EmailNotValidError
 from utils import db
+from utils.validation import json_body
+from utils.cache import cache, access_token_key
+from utils.passwords import hash_password, verify_password, needs_rehash, fits_bcrypt, validate_password_bytes
 
 # Create blueprint
 auth_bp = Blueprint('auth', __name__)
@@ -14,7 +16,7 @@ auth_bp = Blueprint('auth', __name__)
 # Input validation schemas
 class RegisterSchema(Schema):
     email = fields.Email(required=True)
-    password = fields.String(required=True, validate=validate.Length(min=8))
+    password = fields.String(required=True, validate=[validate.Length(min=8), validate_password_bytes])
     first_name = fields.String(required=True)
     last_name = fields.String(required=True)
 
@@ -22,18 +24,27 @@ class LoginSchema(Schema):
     email = fields.Email(required=True)
     password = fields.String(required=True)
 
+_REGISTER_SCHEMA = RegisterSchema()
+_LOGIN_SCHEMA = LoginSchema()
+
+# Helper functions
+def get_access_token(user_id):
+    """Get an access token for a user, reusing a recently signed one"""
+    cache_key = access_token_key(user_id)
+    access_token = cache.get(cache_key)
+    if access_token is None:
+        access_token = create_access_token(identity=user_id)
+        # Reuse for half the token lifetime so callers never get a nearly expired token
+        lifetime = current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+        cache.set(cache_key, access_token, timeout=int(lifetime.total_seconds() // 2))
+    return access_token
+
 # Route definitions
 @auth_bp.route('/register', methods=['POST'])
-def register():
+@json_body(_REGISTER_SCHEMA)
+def register(data):
     """Register a new user"""
-    # Validate input data
-    schema = RegisterSchema()
-    try:
-        data = schema.load(request.json)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
-    conn = g.db
+    conn = db.get_db()
     
     # Check if email already exists
     check_query = "SELECT id FROM users WHERE email = %s"
@@ -49,19 +60,19 @@ def register():
         """
         params = (
             data['email'],
-            generate_password_hash(data['password']),
+            hash_password(data['password']),
             data['first_name'],
             data['last_name'],
             True
         )
-        db.execute_with_commit(conn, insert_query, params)
+        user_id = db.insert_with_commit(conn, insert_query, params)
         
         # Get the newly created user
-        user_query = "SELECT * FROM users WHERE email = %s"
-        user = db.fetch_one(conn, user_query, (data['email'],))
+        user_query = "SELECT * FROM users WHERE id = %s"
+        user = db.fetch_one(conn, user_query, (user_id,))
         
         # Generate tokens
-        access_token = create_access_token(identity=user['id'])
+        access_token = get_access_token(user['id'])
         refresh_token = create_refresh_token(identity=user['id'])
         
         # Remove password hash from response
@@ -80,35 +91,48 @@ def register():
         return jsonify({"message": "Registration failed", "error": str(e)}), 500
 
 @auth_bp.route('/login', methods=['POST'])
-def login():
+@json_body(_LOGIN_SCHEMA)
+def login(data):
     """Login an existing user"""
-    # Validate input data
-    schema = LoginSchema()
-    try:
-        data = schema.load(request.json)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
-    conn = g.db
+    conn = db.get_db()
     
     # Get user by email
-    query = "SELECT * FROM users WHERE email = %s"
-    user = db.fetch_one(conn, query, (data['email'],))
+    query = """
+        SELECT id, password_hash, is_active, email, first_name, last_name, created_at, updated_at
+        FROM users WHERE email = %s
+    """
+    row = db.fetch_one_tuple(conn, query, (data['email'],))
     
     # Check user and password
-    if not user or not check_password_hash(user['password_hash'], data['password']):
+    if not row or not verify_password(row[1], data['password']):
         return jsonify({"message": "Invalid email or password"}), 401
     
+    user_id, password_hash, is_active, email, first_name, last_name, created_at, updated_at = row
+    
     # Check if user is active
-    if not user['is_active']:
+    if not is_active:
         return jsonify({"message": "Account is disabled"}), 403
+    
+    # Upgrade legacy or outdated hashes while we have the plain password;
+    # werkzeug hashes of passwords bcrypt would truncate are left as they are
+    if needs_rehash(password_hash) and fits_bcrypt(data['password']):
+        update_query = "UPDATE users SET password_hash = %s WHERE id = %s"
+        db.execute_with_commit(conn, update_query, (hash_password(data['password']), user_id))
         
     # Generate tokens
-    access_token = create_access_token(identity=user['id'])
-    refresh_token = create_refresh_token(identity=user['id'])
-    
-    # Remove password hash from response
-    user.pop('password_hash', None)
+    access_token = get_access_token(user_id)
+    refresh_token = create_refresh_token(identity=user_id)
+    
+    # Build the response without the password hash
+    user = {
+        "id": user_id,
+        "email": email,
+        "first_name": first_name,
+        "last_name": last_name,
+        "is_active": is_active,
+        "created_at": created_at,
+        "updated_at": updated_at
+    }
     
     return jsonify({
         "message": "Login successful",
@@ -124,7 +148,7 @@ def login():
 def refresh():
     """Refresh access token"""
     current_user_id = get_jwt_identity()
-    conn = g.db
+    conn = db.get_db()
     
     # Verify user exists and is active
     query = "SELECT id, is_active FROM users WHERE id = %s"
@@ -134,7 +158,7 @@ def refresh():
         return jsonify({"message": "User not found or inactive"}), 401
     
     # Generate new access token
-    access_token = create_access_token(identity=current_user_id)
+    access_token = get_access_token(current_user_id)
     
     return jsonify({
         "message": "Token refreshed",
@@ -146,7 +170,7 @@ def refresh():
 def get_current_user():
     """Get current logged in user information"""
     current_user_id = get_jwt_identity()
-    conn = g.db
+    conn = db.get_db()
     
     query = """
         SELECT id, email, first_name, last_name, is_active, created_at, updated_at 
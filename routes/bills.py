@@ -1,25 +1,60 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.bill import Bill, BillFrequency
 from models.category import Category
 from models.account import Account
-from marshmallow import Schema, fields, validate, ValidationError
+from utils.database import db
+from utils.cache import invalidate_reports
+from utils.validation import json_body, is_truthy, reference_error
+from utils.json_provider import iter_json_array
+from marshmallow import Schema, fields, validate
+from sqlalchemy import select, update
 from datetime import datetime, date, timedelta
 
 # Create blueprint
 bills_bp = Blueprint('bills', __name__)
 
+_BILL_FREQUENCY_BY_VALUE = {f.value: f for f in BillFrequency}
+
+# Fields copied straight from a validated update payload onto the bill row
+_BILL_UPDATABLE = ('name', 'amount', 'due_date', 'category_id', 'account_id', 'is_paid', 'notes')
+
 # Input validation schemas
 class BillSchema(Schema):
     name = fields.String(required=True)
     amount = fields.Float(required=True)
     due_date = fields.Date(required=True)
-    frequency = fields.String(required=True, validate=validate.OneOf([f.value for f in BillFrequency]))
+    frequency = fields.String(required=True, validate=validate.OneOf(_BILL_FREQUENCY_BY_VALUE.keys()))
     category_id = fields.Integer(required=True)
     account_id = fields.Integer()
     is_paid = fields.Boolean()
     notes = fields.String()
 
+_BILL_SCHEMA = BillSchema()
+
+# Columns returned by the bill list; selecting plain rows skips ORM hydration
+_BILL_LIST_QUERY = select(
+    Bill.id, Bill.name, Bill.amount, Bill.due_date, Bill.frequency,
+    Bill.is_paid, Bill.notes, Bill.category_id, Bill.account_id
+)
+
+def _check_references(user_id, account_id=None, category_id=None):
+    """Verify the referenced account and category belong to the user
+
+    Both checks run as EXISTS subqueries of a single SELECT. Returns an error
+    response, or None if every given reference is valid.
+    """
+    checks = {}
+    if account_id is not None:
+        checks['account'] = Account.query.filter_by(id=account_id, user_id=user_id).exists()
+    if category_id is not None:
+        checks['category'] = Category.query.filter_by(id=category_id, user_id=user_id).exists()
+    if not checks:
+        return None
+    
+    found = dict(zip(checks, db.session.query(*checks.values()).one()))
+    return reference_error(found.get('account', True), found.get('category', True))
+
 # Route definitions
 @bills_bp.route('/', methods=['GET'])
 @jwt_required()
@@ -27,13 +62,13 @@ def get_all_bills():
     """Get all bills for the current user"""
     current_user_id = get_jwt_identity()
     
+    query = _BILL_LIST_QUERY.where(Bill.user_id == current_user_id)
+    
     # Get filter parameters
     is_paid = request.args.get('is_paid')
     if is_paid is not None:
-        is_paid = is_paid.lower() in ['true', '1', 'yes']
-        bills = Bill.query.filter_by(user_id=current_user_id, is_paid=is_paid).all()
-    else:
-        bills = Bill.query.filter_by(user_id=current_user_id).all()
+        is_paid = is_truthy(is_paid)
+        query = query.where(Bill.is_paid == is_paid)
     
     # Get time range parameters for due dates
     days_range = request.args.get('days_range')
@@ -42,13 +77,18 @@ def get_all_bills():
             days = int(days_range)
             today = date.today()
             end_date = today + timedelta(days=days)
-            bills = [bill for bill in bills if today <= bill.due_date <= end_date]
+            query = query.where(Bill.due_date.between(today, end_date))
         except ValueError:
             pass
     
-    return jsonify({
-        "bills": [bill.to_dict() for bill in bills]
-    }), 200
+    # Fetch bills 100 at a time while the response is written, rather than
+    # loading a user's whole bill list before encoding it
+    bills = db.session.execute(query.execution_options(yield_per=100)).mappings()
+    
+    return Response(
+        stream_with_context(iter_json_array("bills", bills)),
+        mimetype='application/json'
+    ), 200
 
 @bills_bp.route('/<int:bill_id>', methods=['GET'])
 @jwt_required()
@@ -64,34 +104,18 @@ def get_bill(bill_id):
 
 @bills_bp.route('/', methods=['POST'])
 @jwt_required()
-def create_bill():
+@json_body(_BILL_SCHEMA)
+def create_bill(data):
     """Create a new bill"""
     current_user_id = get_jwt_identity()
     
-    # Validate input data
-    schema = BillSchema()
-    try:
-        data = schema.load(request.json)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
-    # Verify category exists and belongs to user
-    category = Category.query.filter_by(id=data['category_id'], user_id=current_user_id).first()
-    if not category:
-        return jsonify({"message": "Category not found or does not belong to you"}), 404
-    
-    # Verify account exists and belongs to user (if provided)
-    account = None
-    if 'account_id' in data and data['account_id']:
-        account = Account.query.filter_by(id=data['account_id'], user_id=current_user_id).first()
-        if not account:
-            return jsonify({"message": "Account not found or does not belong to you"}), 404
-    
-    # Map frequency string to enum
-    try:
-        frequency = BillFrequency(data['frequency'])
-    except ValueError:
-        return jsonify({"message": "Invalid bill frequency"}), 400
+    # Verify category and account (if provided) exist and belong to user
+    error = _check_references(current_user_id, account_id=data.get('account_id') or None, category_id=data['category_id'])
+    if error:
+        return error
+    
+    # Map frequency string to enum (already validated by the schema)
+    frequency = _BILL_FREQUENCY_BY_VALUE[data['frequency']]
     
     # Create new bill
     try:
@@ -107,6 +131,7 @@ def create_bill():
             notes=data.get('notes')
         )
         bill.save()
+        invalidate_reports(current_user_id)
         
         return jsonify({
             "message": "Bill created successfully",
@@ -118,7 +143,8 @@ def create_bill():
 
 @bills_bp.route('/<int:bill_id>', methods=['PUT'])
 @jwt_required()
-def update_bill(bill_id):
+@json_body(_BILL_SCHEMA, partial=True)
+def update_bill(bill_id, data):
     """Update an existing bill"""
     current_user_id = get_jwt_identity()
     
@@ -127,48 +153,24 @@ def update_bill(bill_id):
     if not bill:
         return jsonify({"message": "Bill not found"}), 404
     
-    # Validate input data
-    schema = BillSchema()
-    try:
-        data = schema.load(request.json, partial=True)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
-    # Check category if provided
-    if 'category_id' in data:
-        category = Category.query.filter_by(id=data['category_id'], user_id=current_user_id).first()
-        if not category:
-            return jsonify({"message": "Category not found or does not belong to you"}), 404
-        bill.category_id = data['category_id']
-    
-    # Check account if provided
-    if 'account_id' in data:
-        if data['account_id'] is None:
-            bill.account_id = None
-        else:
-            account = Account.query.filter_by(id=data['account_id'], user_id=current_user_id).first()
-            if not account:
-                return jsonify({"message": "Account not found or does not belong to you"}), 404
-            bill.account_id = data['account_id']
-    
-    # Update other fields
-    if 'name' in data:
-        bill.name = data['name']
-    if 'amount' in data:
-        bill.amount = data['amount']
-    if 'due_date' in data:
-        bill.due_date = data['due_date']
-    if 'frequency' in data:
-        try:
-            bill.frequency = BillFrequency(data['frequency'])
-        except ValueError:
-            return jsonify({"message": "Invalid bill frequency"}), 400
-    if 'is_paid' in data:
-        bill.is_paid = data['is_paid']
-    if 'notes' in data:
-        bill.notes = data['notes']
+    # Check category and account if provided
+    error = _check_references(current_user_id, account_id=data.get('account_id'), category_id=data.get('category_id'))
+    if error:
+        return error
     
-    bill.save()
+    # Apply all provided fields in a single UPDATE
+    values = {field: data[field] for field in _BILL_UPDATABLE if field in data}
+    if 'frequency' in data:
+        values['frequency'] = _BILL_FREQUENCY_BY_VALUE[data['frequency']]
+    if values:
+        db.session.execute(
+            update(Bill)
+            .where(Bill.id == bill_id, Bill.user_id == current_user_id)
+            .values(**values)
+            .execution_options(synchronize_session='evaluate')
+        )
+        db.session.commit()
+        invalidate_reports(current_user_id)
     
     return jsonify({
         "message": "Bill updated successfully",
@@ -188,6 +190,7 @@ def mark_bill_as_paid(bill_id):
     
     # Mark as paid
     bill.mark_as_paid()
+    invalidate_reports(current_user_id)
     
     return jsonify({
         "message": "Bill marked as paid",
@@ -207,6 +210,7 @@ def mark_bill_as_unpaid(bill_id):
     
     # Mark as unpaid
     bill.mark_as_unpaid()
+    invalidate_reports(current_user_id)
     
     return jsonify({
         "message": "Bill marked as unpaid",
@@ -227,6 +231,7 @@ def delete_bill(bill_id):
     # Delete bill
     try:
         bill.delete()
+        invalidate_reports(current_user_id)
         return jsonify({"message": "Bill deleted successfully"}), 200
     except Exception as e:
         return jsonify({"message": "Failed to delete bill", "error": str(e)}), 500 
\ No newline at end of file
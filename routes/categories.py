@@ -1,8 +1,12 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from marshmallow import Schema, fields, validate, ValidationError
+from marshmallow import Schema, fields, validate
 from utils import db
+from utils.validation import json_body
+from utils.cache import cache, categories_key, invalidate_reports
 import enum
+import functools
+import re
 
 # Create blueprint
 categories_bp = Blueprint('categories', __name__)
@@ -12,12 +16,33 @@ class CategoryType(enum.Enum):
     INCOME = "income"
     EXPENSE = "expense"
 
+_CATEGORY_TYPE_BY_VALUE = {t.value: t for t in CategoryType}
+
+# Hex colors such as #1a2b3c or #abc
+_COLOR_RE = re.compile(r'^#([A-Fa-f0-9]{6}|[A-Fa-f0-9]{3})$')
+
 # Input validation schemas
 class CategorySchema(Schema):
     name = fields.String(required=True)
-    type = fields.String(required=True, validate=validate.OneOf([t.value for t in CategoryType]))
+    type = fields.String(required=True, validate=validate.OneOf(_CATEGORY_TYPE_BY_VALUE.keys()))
     icon = fields.String()
-    color = fields.String(validate=validate.Regexp(r'^#([A-Fa-f0-9]{6}|[A-Fa-f0-9]{3})$'))
+    color = fields.String(validate=validate.Regexp(_COLOR_RE))
+
+_CATEGORY_SCHEMA = CategorySchema()
+
+# Fields a category update may change, in SET clause order
+_UPDATABLE_FIELDS = ('name', 'type', 'icon', 'color')
+
+@functools.lru_cache(maxsize=None)
+def _update_category_sql(fields):
+    """Build the UPDATE statement for a tuple of fields (at most 16 shapes)"""
+    return f"UPDATE categories SET {', '.join(f'{field} = %s' for field in fields)} WHERE id = %s AND user_id = %s"
+
+def _invalidate_categories(user_id):
+    """Drop every cached category list variant for a user"""
+    cache.delete_many(*(categories_key(user_id, t) for t in (None, *_CATEGORY_TYPE_BY_VALUE)))
+    # Reports show category names and colors
+    invalidate_reports(user_id)
 
 # Route definitions
 @categories_bp.route('/', methods=['GET'])
@@ -25,16 +50,24 @@ class CategorySchema(Schema):
 def get_all_categories():
     """Get all categories for the current user"""
     current_user_id = get_jwt_identity()
-    conn = g.db
     
     # Build query based on optional type filter
     category_type = request.args.get('type')
-    if category_type and category_type in [t.value for t in CategoryType]:
-        query = "SELECT * FROM categories WHERE user_id = %s AND type = %s ORDER BY name"
-        categories = db.fetch_all(conn, query, (current_user_id, category_type))
-    else:
-        query = "SELECT * FROM categories WHERE user_id = %s ORDER BY name"
-        categories = db.fetch_all(conn, query, (current_user_id,))
+    if category_type not in _CATEGORY_TYPE_BY_VALUE:
+        category_type = None
+    
+    # Serve from cache until a category write invalidates it
+    cache_key = categories_key(current_user_id, category_type)
+    categories = cache.get(cache_key)
+    if categories is None:
+        conn = db.get_db()
+        if category_type:
+            query = "SELECT id, name, type, icon, color FROM categories WHERE user_id = %s AND type = %s ORDER BY name"
+            categories = db.fetch_all(conn, query, (current_user_id, category_type))
+        else:
+            query = "SELECT id, name, type, icon, color FROM categories WHERE user_id = %s ORDER BY name"
+            categories = db.fetch_all(conn, query, (current_user_id,))
+        cache.set(cache_key, categories)
     
     return jsonify({"categories": categories}), 200
 
@@ -43,7 +76,7 @@ def get_all_categories():
 def get_category(category_id):
     """Get a specific category by ID"""
     current_user_id = get_jwt_identity()
-    conn = g.db
+    conn = db.get_db()
     
     query = "SELECT * FROM categories WHERE id = %s AND user_id = %s"
     category = db.fetch_one(conn, query, (category_id, current_user_id))
@@ -55,32 +88,13 @@ def get_category(category_id):
 
 @categories_bp.route('/', methods=['POST'])
 @jwt_required()
-def create_category():
+@json_body(_CATEGORY_SCHEMA)
+def create_category(data):
     """Create a new transaction category"""
     current_user_id = get_jwt_identity()
-    conn = g.db
-    
-    # Validate input data
-    schema = CategorySchema()
-    try:
-        data = schema.load(request.json)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
+    conn = db.get_db()
     
-    # Validate category type
-    try:
-        CategoryType(data['type'])
-    except ValueError:
-        return jsonify({"message": "Invalid category type"}), 400
-    
-    # Check if category with same name and type already exists
-    check_query = "SELECT id FROM categories WHERE name = %s AND type = %s AND user_id = %s"
-    existing = db.fetch_one(conn, check_query, (data['name'], data['type'], current_user_id))
-    
-    if existing:
-        return jsonify({"message": "Category with this name and type already exists"}), 409
-    
-    # Create new category
+    # Create new category; the unique key rejects duplicate names per type
     try:
         query = """
             INSERT INTO categories (name, type, icon, color, user_id)
@@ -93,85 +107,46 @@ def create_category():
             data.get('color'),
             current_user_id
         )
-        db.execute_with_commit(conn, query, params)
+        category_id = db.insert_with_commit(conn, query, params)
+        _invalidate_categories(current_user_id)
         
         # Get the newly created category
-        query = "SELECT * FROM categories WHERE user_id = %s ORDER BY id DESC LIMIT 1"
-        category = db.fetch_one(conn, query, (current_user_id,))
+        query = "SELECT * FROM categories WHERE id = %s"
+        category = db.fetch_one(conn, query, (category_id,))
         
         return jsonify({
             "message": "Category created successfully",
             "category": category
         }), 201
         
+    except db.DuplicateKeyError:
+        return jsonify({"message": "Category with this name and type already exists"}), 409
     except Exception as e:
         return jsonify({"message": "Failed to create category", "error": str(e)}), 500
 
 @categories_bp.route('/<int:category_id>', methods=['PUT'])
 @jwt_required()
-def update_category(category_id):
+@json_body(_CATEGORY_SCHEMA, partial=True)
+def update_category(category_id, data):
     """Update an existing category"""
     current_user_id = get_jwt_identity()
-    conn = g.db
-    
-    # Check if category exists and belongs to user
-    check_query = "SELECT * FROM categories WHERE id = %s AND user_id = %s"
-    category = db.fetch_one(conn, check_query, (category_id, current_user_id))
-    if not category:
-        return jsonify({"message": "Category not found"}), 404
-    
-    # Validate input data
-    schema = CategorySchema()
-    try:
-        data = schema.load(request.json, partial=True)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
-    # Validate category type if provided
-    if 'type' in data:
-        try:
-            CategoryType(data['type'])
-        except ValueError:
-            return jsonify({"message": "Invalid category type"}), 400
-    
-    # Check for duplicate after update
-    if 'name' in data or 'type' in data:
-        check_query = """
-            SELECT id FROM categories 
-            WHERE name = %s AND type = %s AND user_id = %s AND id != %s
-        """
-        params = (
-            data.get('name', category['name']),
-            data.get('type', category['type']),
-            current_user_id,
-            category_id
-        )
-        existing = db.fetch_one(conn, check_query, params)
-        
-        if existing:
-            return jsonify({"message": "Category with this name and type already exists"}), 409
-    
-    # Build update query dynamically based on provided fields
-    update_fields = []
-    params = []
-    for field in ['name', 'type', 'icon', 'color']:
-        if field in data:
-            update_fields.append(f"{field} = %s")
-            params.append(data[field])
     
+    # Look up the update statement for the provided fields
+    update_fields = tuple(field for field in _UPDATABLE_FIELDS if field in data)
     if not update_fields:
         return jsonify({"message": "No fields to update"}), 400
     
-    # Add category_id and user_id to params
-    params.extend([category_id, current_user_id])
+    params = (*(data[field] for field in update_fields), category_id, current_user_id)
+    conn = db.get_db()
     
-    # Update category
-    query = f"""
-        UPDATE categories 
-        SET {', '.join(update_fields)}
-        WHERE id = %s AND user_id = %s
-    """
-    db.execute_with_commit(conn, query, params)
+    # Update category; the WHERE clause checks ownership and the unique key
+    # rejects duplicate names per type
+    try:
+        if not db.execute_with_commit(conn, _update_category_sql(update_fields), params):
+            return jsonify({"message": "Category not found"}), 404
+    except db.DuplicateKeyError:
+        return jsonify({"message": "Category with this name and type already exists"}), 409
+    _invalidate_categories(current_user_id)
     
     # Get updated category
     query = "SELECT * FROM categories WHERE id = %s"
@@ -187,27 +162,25 @@ def update_category(category_id):
 def delete_category(category_id):
     """Delete a category"""
     current_user_id = get_jwt_identity()
-    conn = g.db
-    
-    # Check if category exists and belongs to user
-    check_query = "SELECT id FROM categories WHERE id = %s AND user_id = %s"
-    category = db.fetch_one(conn, check_query, (category_id, current_user_id))
-    if not category:
-        return jsonify({"message": "Category not found"}), 404
-    
-    # Check if category is in use by any transactions
-    check_query = "SELECT COUNT(*) as count FROM transactions WHERE category_id = %s"
-    result = db.fetch_one(conn, check_query, (category_id,))
-    if result and result['count'] > 0:
-        return jsonify({
-            "message": "Cannot delete category because it is assigned to transactions",
-            "transaction_count": result['count']
-        }), 400
+    conn = db.get_db()
     
-    # Delete category
+    # Delete category; the ON DELETE RESTRICT foreign keys on transactions
+    # and bills refuse categories that are still in use
     try:
         query = "DELETE FROM categories WHERE id = %s AND user_id = %s"
-        db.execute_with_commit(conn, query, (category_id, current_user_id))
+        if not db.execute_with_commit(conn, query, (category_id, current_user_id)):
+            return jsonify({"message": "Category not found"}), 404
+        _invalidate_categories(current_user_id)
         return jsonify({"message": "Category deleted successfully"}), 200
+    except db.RowReferencedError:
+        # Only count usages on this rare path
+        check_query = "SELECT COUNT(*) as count FROM transactions WHERE category_id = %s"
+        result = db.fetch_one(conn, check_query, (category_id,))
+        if result and result['count'] > 0:
+            return jsonify({
+                "message": "Cannot delete category because it is assigned to transactions",
+                "transaction_count": result['count']
+            }), 400
+        return jsonify({"message": "Cannot delete category because it is assigned to bills"}), 400
     except Exception as e:
         return jsonify({"message": "Failed to delete category", "error": str(e)}), 500 
\ No newline at end of file
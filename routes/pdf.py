@@ -1,11 +1,15 @@
 import os
 import uuid
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from models.pdf_statement import PDFStatement, ProcessingStatus
 from models.account import Account
+from utils.database import db
+from utils.jobs import enqueue_statement_processing
+from utils.json_provider import iter_json_array
 from marshmallow import Schema, fields, validate, ValidationError
+from sqlalchemy import select
 from datetime import datetime
 
 # Create blueprint
@@ -18,6 +22,19 @@ class PDFUploadSchema(Schema):
     institution = fields.String()
     account_number_last4 = fields.String(validate=validate.Length(equal=4))
 
+_PDF_UPLOAD_SCHEMA = PDFUploadSchema()
+
+# Columns returned by the statement list; plain rows never touch relationships
+_STATEMENT_LIST_QUERY = select(
+    PDFStatement.id, PDFStatement.original_filename, PDFStatement.uploaded_at,
+    PDFStatement.processing_status, PDFStatement.processing_error,
+    PDFStatement.statement_date, PDFStatement.institution,
+    PDFStatement.account_number_last4, PDFStatement.account_id
+)
+
+# Copy buffer for writing uploaded statements to disk
+_UPLOAD_BUFFER_SIZE = 1024 * 1024
+
 # Helper functions
 def allowed_file(filename):
     """Check if file has an allowed extension"""
@@ -42,9 +59,8 @@ def upload_pdf():
         return jsonify({"message": "No file selected"}), 400
     
     # Validate input data
-    schema = PDFUploadSchema()
     try:
-        data = schema.load(request.form)
+        data = _PDF_UPLOAD_SCHEMA.load(request.form)
     except ValidationError as err:
         return jsonify({"message": "Validation error", "errors": err.messages}), 400
     
@@ -59,9 +75,9 @@ def upload_pdf():
         original_filename = secure_filename(file.filename)
         filename = f"{uuid.uuid4().hex}.pdf"
         
-        # Save the file
+        # Save the file, copying in 1 MiB chunks instead of Werkzeug's 16 KiB default
         file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        file.save(file_path, buffer_size=_UPLOAD_BUFFER_SIZE)
         
         # Create database record
         try:
@@ -80,21 +96,27 @@ def upload_pdf():
                 statement_date=statement_date
             )
             pdf_statement.save()
-            
-            # Start background processing task (this would use a job queue in production)
-            # For now, we'll just update the status (real processing would be implemented in services module)
-            pdf_statement.update_processing_status(ProcessingStatus.PROCESSING)
-            
-            return jsonify({
-                "message": "PDF statement uploaded successfully",
-                "statement": pdf_statement.to_dict()
-            }), 201
-            
         except Exception as e:
             # Delete the file if database record creation fails
             if os.path.exists(file_path):
                 os.remove(file_path)
             return jsonify({"message": "Failed to process statement", "error": str(e)}), 500
+        
+        # Extract transactions in a worker so the upload returns immediately.
+        # The upload itself is kept if queueing fails; it can be retried later
+        try:
+            enqueue_statement_processing(pdf_statement.id)
+        except Exception as e:
+            pdf_statement.update_processing_status(ProcessingStatus.FAILED, f"Could not queue processing: {e}")
+            return jsonify({
+                "message": "PDF statement uploaded, but processing could not be queued",
+                "statement": pdf_statement.to_dict()
+            }), 503
+        
+        return jsonify({
+            "message": "PDF statement uploaded successfully",
+            "statement": pdf_statement.to_dict()
+        }), 201
     
     return jsonify({"message": "Invalid file format, only PDF files are allowed"}), 400
 
@@ -104,27 +126,21 @@ def get_all_statements():
     """Get all PDF statements for the current user"""
     current_user_id = get_jwt_identity()
     
-    # Filter by account if specified
-    account_id = request.args.get('account_id')
-    if account_id:
-        try:
-            account_id = int(account_id)
-            statements = PDFStatement.query.filter_by(
-                user_id=current_user_id, 
-                account_id=account_id
-            ).order_by(PDFStatement.uploaded_at.desc()).all()
-        except ValueError:
-            statements = PDFStatement.query.filter_by(
-                user_id=current_user_id
-            ).order_by(PDFStatement.uploaded_at.desc()).all()
-    else:
-        statements = PDFStatement.query.filter_by(
-            user_id=current_user_id
-        ).order_by(PDFStatement.uploaded_at.desc()).all()
+    query = _STATEMENT_LIST_QUERY.where(PDFStatement.user_id == current_user_id)
     
-    return jsonify({
-        "statements": [statement.to_dict() for statement in statements]
-    }), 200
+    # Filter by account if specified
+    account_id = request.args.get('account_id', type=int)
+    if account_id is not None:
+        query = query.where(PDFStatement.account_id == account_id)
+    
+    # Newest first, fetched in batches of 500 as the JSON array is streamed
+    query = query.order_by(PDFStatement.uploaded_at.desc())
+    statements = db.session.execute(query.execution_options(yield_per=500)).mappings()
+    
+    return Response(
+        stream_with_context(iter_json_array("statements", statements)),
+        mimetype='application/json'
+    ), 200
 
 @pdf_bp.route('/statements/<int:statement_id>', methods=['GET'])
 @jwt_required()
@@ -148,17 +164,14 @@ def process_statement(statement_id):
     if not statement:
         return jsonify({"message": "Statement not found"}), 404
     
-    # Update status to processing
-    statement.update_processing_status(ProcessingStatus.PROCESSING)
-    
-    # Here, you would trigger the actual processing job
-    # For now, we'll just pretend it worked (real implementation in services module)
-    statement.update_processing_status(ProcessingStatus.COMPLETED)
+    # Hand the statement to a worker; it updates the status as it goes
+    if not enqueue_statement_processing(statement.id):
+        return jsonify({"message": "Statement is already being processed"}), 409
     
     return jsonify({
         "message": "Statement processing triggered successfully",
         "statement": statement.to_dict()
-    }), 200
+    }), 202
 
 @pdf_bp.route('/statements/<int:statement_id>', methods=['DELETE'])
 @jwt_required()
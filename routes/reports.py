@@ -2,56 +2,80 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.transaction import Transaction
 from models.category import Category, CategoryType
-from models.account import Account
 from models.bill import Bill
 from utils.database import db
-from datetime import datetime, date, timedelta
+from utils.cache import cached_report
+from datetime import date, timedelta
 import calendar
+import functools
 
 # Create blueprint
 reports_bp = Blueprint('reports', __name__)
 
 # Helper functions
+@functools.lru_cache(maxsize=12)
+def month_bounds(year, month):
+    """Get the first and last day of a month"""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
 def get_date_range_from_params():
     """Get start and end dates from request parameters"""
-    # Default to current month if not specified
-    today = date.today()
-    default_start = date(today.year, today.month, 1)
-    default_end = date(today.year, today.month, calendar.monthrange(today.year, today.month)[1])
+    start_param = request.args.get('start_date')
+    end_param = request.args.get('end_date')
     
     try:
-        if 'start_date' in request.args:
-            start_date = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d').date()
-        else:
-            start_date = default_start
-            
-        if 'end_date' in request.args:
-            end_date = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d').date()
-        else:
-            end_date = default_end
+        start_date = date.fromisoformat(start_param) if start_param is not None else None
+        end_date = date.fromisoformat(end_param) if end_param is not None else None
     except ValueError:
-        # Invalid date format, use defaults
-        start_date = default_start
-        end_date = default_end
+        # Invalid date format, use defaults for both
+        start_date = end_date = None
+    
+    # Default to current month if not specified
+    if start_date is None or end_date is None:
+        today = date.today()
+        default_start, default_end = month_bounds(today.year, today.month)
+        start_date = start_date or default_start
+        end_date = end_date or default_end
     
     return start_date, end_date
 
+def day_after(end_date):
+    """Get the exclusive upper bound for a date range, clamped at date.max"""
+    return end_date + timedelta(days=1) if end_date < date.max else date.max
+
+def format_bill_row(bill):
+    """Convert a bill summary row into its JSON-ready form"""
+    # Dates are left as date objects; the JSON provider writes them as ISO strings
+    return {
+        'id': bill['id'],
+        'name': bill['name'],
+        'amount': float(bill['amount']),
+        'due_date': bill['due_date'],
+        'frequency': bill['frequency'],
+        'is_paid': bool(bill['is_paid']),
+        'category_name': bill['category_name'],
+        'account_name': bill['account_name']
+    }
+
 # Route definitions
 @reports_bp.route('/spending-by-category', methods=['GET'])
 @jwt_required()
+@cached_report()
 def spending_by_category():
     """Get spending summarized by category for a given date range"""
     current_user_id = get_jwt_identity()
     start_date, end_date = get_date_range_from_params()
     
     # Get all expense transactions (negative amounts) for the date range
-    # Join with categories to filter by expense type
+    # Join with categories to filter by expense type; every summed amount is
+    # negative, so negating the sum gives the positive total without ABS()
     query = """
-        SELECT c.id, c.name, c.color, ABS(SUM(t.amount)) as total
+        SELECT c.id, c.name, c.color, -SUM(t.amount) as total,
+               -SUM(SUM(t.amount)) OVER () as grand_total
         FROM transactions t
         JOIN categories c ON t.category_id = c.id
         WHERE t.user_id = %s
-        AND t.date BETWEEN %s AND %s
+        AND t.date >= %s AND t.date < %s
         AND c.type = %s
         AND t.amount < 0
         GROUP BY c.id, c.name, c.color
@@ -60,77 +84,65 @@ def spending_by_category():
     
     results = db.fetch_all(
         query, 
-        (current_user_id, start_date.isoformat(), end_date.isoformat(), CategoryType.EXPENSE.value)
+        (current_user_id, start_date.isoformat(), day_after(end_date).isoformat(), CategoryType.EXPENSE.value)
     )
     
-    # Calculate total spending
-    total_spending = sum(item['total'] for item in results)
+    # Total spending is repeated on every row by the window function
+    total_spending = float(results[0]['grand_total']) if results else 0
     
     # Format response
-    categories = []
-    for item in results:
-        categories.append({
+    categories = [
+        {
             'id': item['id'],
             'name': item['name'],
             'color': item['color'],
             'amount': float(item['total']),
             'percentage': round((float(item['total']) / total_spending * 100), 2) if total_spending > 0 else 0
-        })
+        }
+        for item in results
+    ]
     
     return jsonify({
-        'start_date': start_date.isoformat(),
-        'end_date': end_date.isoformat(),
+        'start_date': start_date,
+        'end_date': end_date,
         'total': float(total_spending),
         'categories': categories
     }), 200
 
 @reports_bp.route('/income-vs-expenses', methods=['GET'])
 @jwt_required()
+@cached_report()
 def income_vs_expenses():
     """Get income vs expenses summary for a given date range"""
     current_user_id = get_jwt_identity()
     start_date, end_date = get_date_range_from_params()
     
-    # Get income (positive amounts)
-    income_query = """
-        SELECT SUM(t.amount) as total
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = %s
-        AND t.date BETWEEN %s AND %s
-        AND c.type = %s
-        AND t.amount > 0
-    """
-    
-    income_result = db.fetch_one(
-        income_query, 
-        (current_user_id, start_date.isoformat(), end_date.isoformat(), CategoryType.INCOME.value)
-    )
-    
-    # Get expenses (negative amounts, but we'll make them positive for display)
-    expense_query = """
-        SELECT ABS(SUM(t.amount)) as total
+    # Sum income (positive amounts) and expenses (negative amounts, made
+    # positive for display) in a single pass over the date range
+    query = """
+        SELECT
+            SUM(CASE WHEN c.type = %s AND t.amount > 0 THEN t.amount ELSE 0 END) as income,
+            SUM(CASE WHEN c.type = %s AND t.amount < 0 THEN -t.amount ELSE 0 END) as expenses
         FROM transactions t
         JOIN categories c ON t.category_id = c.id
         WHERE t.user_id = %s
-        AND t.date BETWEEN %s AND %s
-        AND c.type = %s
-        AND t.amount < 0
+        AND t.date >= %s AND t.date < %s
     """
     
-    expense_result = db.fetch_one(
-        expense_query, 
-        (current_user_id, start_date.isoformat(), end_date.isoformat(), CategoryType.EXPENSE.value)
+    result = db.fetch_one(
+        query, 
+        (CategoryType.INCOME.value, CategoryType.EXPENSE.value,
+         current_user_id, start_date.isoformat(), day_after(end_date).isoformat())
     )
     
-    # Calculate totals and net
-    total_income = float(income_result['total'] if income_result and income_result['total'] else 0)
-    total_expenses = float(expense_result['total'] if expense_result and expense_result['total'] else 0)
+    # Calculate totals and net (SUM is NULL when no transactions match)
+    total_income = float(result['income'] if result and result['income'] else 0)
+    total_expenses = float(result['expenses'] if result and result['expenses'] else 0)
     net = total_income - total_expenses
     
     return jsonify({
-        'start_date': start_date.isoformat(),
-        'end_date': end_date.isoformat(),
+        'start_date': start_date,
+        'end_date': end_date,
         'income': total_income,
         'expenses': total_expenses,
         'net': net
@@ -138,27 +150,35 @@ def income_vs_expenses():
 
 @reports_bp.route('/account-balances', methods=['GET'])
 @jwt_required()
+@cached_report()
 def account_balances():
     """Get current account balances"""
     current_user_id = get_jwt_identity()
     
-    # Get all active accounts
-    accounts = Account.get_active_by_user_id(current_user_id)
+    # Get all active accounts; the window function adds the overall total to
+    # every row so no Python-side summing is needed
+    accounts_query = """
+        SELECT id, name, type, balance, currency,
+               SUM(balance) OVER () as total_balance
+        FROM accounts
+        WHERE user_id = %s AND is_active = 1
+        ORDER BY name
+    """
     
-    # Format response
-    account_balances = []
-    total_balance = 0
+    accounts = db.fetch_all(accounts_query, (current_user_id,))
     
-    for account in accounts:
-        balance = float(account.balance) if hasattr(account, 'balance') else 0
-        account_balances.append({
-            'id': account.id,
-            'name': account.name,
-            'type': account.account_type,
-            'balance': balance,
-            'currency': account.currency
-        })
-        total_balance += balance
+    # Format response
+    account_balances = [
+        {
+            'id': account['id'],
+            'name': account['name'],
+            'type': account['type'],
+            'balance': float(account['balance']),
+            'currency': account['currency']
+        }
+        for account in accounts
+    ]
+    total_balance = float(accounts[0]['total_balance']) if accounts else 0
     
     # Get recent transactions
     recent_query = """
@@ -174,16 +194,17 @@ def account_balances():
     recent_transactions = db.fetch_all(recent_query, (current_user_id,))
     
     # Format recent transactions
-    recent = []
-    for tx in recent_transactions:
-        recent.append({
+    recent = [
+        {
             'id': tx['id'],
-            'date': tx['date'].isoformat() if isinstance(tx['date'], date) else tx['date'],
+            'date': tx['date'],
             'description': tx['description'],
             'amount': float(tx['amount']),
             'account_name': tx['account_name'],
             'category_name': tx['category_name']
-        })
+        }
+        for tx in recent_transactions
+    ]
     
     return jsonify({
         'total_balance': total_balance,
@@ -193,75 +214,41 @@ def account_balances():
 
 @reports_bp.route('/bill-summary', methods=['GET'])
 @jwt_required()
+@cached_report()
 def bill_summary():
     """Get summary of upcoming bills"""
     current_user_id = get_jwt_identity()
     
-    # Get upcoming bills (due in the next 30 days)
-    today = date.today()
-    end_date = today + timedelta(days=30)
-    
-    upcoming_query = """
-        SELECT b.id, b.name, b.amount, b.due_date, b.frequency, b.is_paid,
-               c.name as category_name, a.name as account_name
-        FROM bills b
-        LEFT JOIN categories c ON b.category_id = c.id
-        LEFT JOIN accounts a ON b.account_id = a.id
-        WHERE b.user_id = %s
-        AND b.due_date BETWEEN %s AND %s
-        ORDER BY b.due_date ASC
-    """
-    
-    upcoming_bills = db.fetch_all(
-        upcoming_query, 
-        (current_user_id, today.isoformat(), end_date.isoformat())
-    )
+    # Get upcoming bills (due in the next 30 days) and overdue unpaid bills
+    # together; the window function totals each group alongside its rows
+    today = date.today().isoformat()
+    end_date = (date.today() + timedelta(days=31)).isoformat()
     
-    # Get overdue bills
-    overdue_query = """
+    query = """
         SELECT b.id, b.name, b.amount, b.due_date, b.frequency, b.is_paid,
-               c.name as category_name, a.name as account_name
+               c.name as category_name, a.name as account_name,
+               b.due_date < %s as is_overdue,
+               SUM(b.amount) OVER (PARTITION BY b.due_date < %s) as group_total
         FROM bills b
         LEFT JOIN categories c ON b.category_id = c.id
         LEFT JOIN accounts a ON b.account_id = a.id
         WHERE b.user_id = %s
-        AND b.due_date < %s
-        AND b.is_paid = 0
+        AND ((b.due_date >= %s AND b.due_date < %s) OR (b.due_date < %s AND b.is_paid = 0))
         ORDER BY b.due_date ASC
     """
     
-    overdue_bills = db.fetch_all(overdue_query, (current_user_id, today.isoformat()))
-    
-    # Format response
-    upcoming = []
-    for bill in upcoming_bills:
-        upcoming.append({
-            'id': bill['id'],
-            'name': bill['name'],
-            'amount': float(bill['amount']),
-            'due_date': bill['due_date'].isoformat() if isinstance(bill['due_date'], date) else bill['due_date'],
-            'frequency': bill['frequency'],
-            'is_paid': bool(bill['is_paid']),
-            'category_name': bill['category_name'],
-            'account_name': bill['account_name']
-        })
-    
-    overdue = []
-    for bill in overdue_bills:
-        overdue.append({
-            'id': bill['id'],
-            'name': bill['name'],
-            'amount': float(bill['amount']),
-            'due_date': bill['due_date'].isoformat() if isinstance(bill['due_date'], date) else bill['due_date'],
-            'frequency': bill['frequency'],
-            'is_paid': bool(bill['is_paid']),
-            'category_name': bill['category_name'],
-            'account_name': bill['account_name']
-        })
+    bills = db.fetch_all(query, (today, today, current_user_id, today, end_date, today))
     
-    # Calculate totals
-    total_upcoming = sum(bill['amount'] for bill in upcoming)
-    total_overdue = sum(bill['amount'] for bill in overdue)
+    # Split into upcoming and overdue, keeping due date order
+    upcoming, overdue = [], []
+    total_upcoming = total_overdue = 0
+    for bill in bills:
+        if bill['is_overdue']:
+            overdue.append(format_bill_row(bill))
+            total_overdue = bill['group_total']
+        else:
+            upcoming.append(format_bill_row(bill))
+            total_upcoming = bill['group_total']
     
     return jsonify({
         'upcoming_bills': upcoming,
@@ -272,95 +259,63 @@ def bill_summary():
 
 @reports_bp.route('/monthly-trend', methods=['GET'])
 @jwt_required()
+@cached_report()
 def monthly_trend():
     """Get monthly income and expense trends for the past 6 months"""
     current_user_id = get_jwt_identity()
     
-    # Calculate date range (past 6 months)
+    # Calculate date range (the current month and the five before it)
     end_date = date.today()
-    start_date = date(end_date.year - 1 if end_date.month <= 6 else end_date.year, 
-                     (end_date.month - 6) % 12 + 1, 1)
-    
-    # Get monthly income
-    income_query = """
-        SELECT 
-            YEAR(t.date) as year,
-            MONTH(t.date) as month,
-            SUM(t.amount) as total
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = %s
-        AND t.date BETWEEN %s AND %s
-        AND c.type = %s
-        AND t.amount > 0
-        GROUP BY YEAR(t.date), MONTH(t.date)
-        ORDER BY YEAR(t.date), MONTH(t.date)
-    """
-    
-    income_results = db.fetch_all(
-        income_query, 
-        (current_user_id, start_date.isoformat(), end_date.isoformat(), CategoryType.INCOME.value)
-    )
-    
-    # Get monthly expenses
-    expense_query = """
+    month_index = end_date.year * 12 + end_date.month - 1
+    month_starts = [
+        date(index // 12, index % 12 + 1, 1)
+        for index in range(month_index - 5, month_index + 1)
+    ]
+    start_date = month_starts[0]
+    
+    # Get monthly income and expenses in one grouped pass
+    query = """
         SELECT 
             YEAR(t.date) as year,
             MONTH(t.date) as month,
-            ABS(SUM(t.amount)) as total
+            SUM(CASE WHEN c.type = %s AND t.amount > 0 THEN t.amount ELSE 0 END) as income,
+            SUM(CASE WHEN c.type = %s AND t.amount < 0 THEN -t.amount ELSE 0 END) as expenses
         FROM transactions t
         JOIN categories c ON t.category_id = c.id
         WHERE t.user_id = %s
-        AND t.date BETWEEN %s AND %s
-        AND c.type = %s
-        AND t.amount < 0
+        AND t.date >= %s AND t.date < %s
         GROUP BY YEAR(t.date), MONTH(t.date)
-        ORDER BY YEAR(t.date), MONTH(t.date)
     """
     
-    expense_results = db.fetch_all(
-        expense_query, 
-        (current_user_id, start_date.isoformat(), end_date.isoformat(), CategoryType.EXPENSE.value)
+    results = db.fetch_all(
+        query, 
+        (CategoryType.INCOME.value, CategoryType.EXPENSE.value,
+         current_user_id, start_date.isoformat(), (end_date + timedelta(days=1)).isoformat())
     )
     
     # Create a dictionary of months for easy lookup
-    months = {}
-    current = start_date
-    while current <= end_date:
-        month_key = f"{current.year}-{current.month:02d}"
-        months[month_key] = {
-            'year': current.year,
-            'month': current.month,
-            'month_name': current.strftime('%b %Y'),
+    months = {
+        f"{start.year}-{start.month:02d}": {
+            'year': start.year,
+            'month': start.month,
+            'month_name': start.strftime('%b %Y'),
             'income': 0,
             'expenses': 0,
             'net': 0
         }
-        # Move to next month
-        if current.month == 12:
-            current = date(current.year + 1, 1, 1)
-        else:
-            current = date(current.year, current.month + 1, 1)
-    
-    # Fill in income data
-    for item in income_results:
-        month_key = f"{item['year']}-{item['month']:02d}"
-        if month_key in months:
-            months[month_key]['income'] = float(item['total'])
+        for start in month_starts
+    }
     
-    # Fill in expense data
-    for item in expense_results:
-        month_key = f"{item['year']}-{item['month']:02d}"
-        if month_key in months:
-            months[month_key]['expenses'] = float(item['total'])
-    
-    # Calculate net for each month
-    for month_key in months:
-        months[month_key]['net'] = months[month_key]['income'] - months[month_key]['expenses']
+    # Fill in income, expenses and net for months with transactions
+    for item in results:
+        month = months.get(f"{item['year']}-{item['month']:02d}")
+        if month is not None:
+            month['income'] = float(item['income'])
+            month['expenses'] = float(item['expenses'])
+            month['net'] = month['income'] - month['expenses']
     
-    # Convert to list and sort by date
+    # Months were inserted in calendar order
     trend_data = list(months.values())
-    trend_data.sort(key=lambda x: (x['year'], x['month']))
     
     return jsonify({
         'trend_data': trend_data
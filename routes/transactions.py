@@ -1,15 +1,24 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from marshmallow import Schema, fields, validate, ValidationError
-from datetime import datetime, date
-from enum import Enum
+from marshmallow import Schema, fields
+from datetime import date
+from utils import db
+from utils.cache import cache, accounts_key, invalidate_reports
+from utils.validation import json_body, is_truthy, reference_error
 
 # Create blueprint
 transactions_bp = Blueprint('transactions', __name__)
 
-class CategoryType(Enum):
-    INCOME = 'income'
-    EXPENSE = 'expense'
+# Transaction list page sizes
+_DEFAULT_PAGE_SIZE = 100
+_MAX_PAGE_SIZE = 200
+
+# Sortable request fields mapped to their columns
+_SORT_COLUMNS = {
+    'date': 't.date',
+    'amount': 't.amount',
+    'description': 't.description'
+}
 
 # Input validation schemas
 class TransactionSchema(Schema):
@@ -21,50 +30,68 @@ class TransactionSchema(Schema):
     notes = fields.String()
     is_reconciled = fields.Boolean()
 
-class TransactionFilterParams(Schema):
-    start_date = fields.Date()
-    end_date = fields.Date()
-    account_id = fields.Integer()
-    category_id = fields.Integer()
-    min_amount = fields.Float()
-    max_amount = fields.Float()
-    description = fields.String()
-    is_reconciled = fields.Boolean()
-    category_type = fields.String(validate=validate.OneOf([t.value for t in CategoryType]))
+_TRANSACTION_SCHEMA = TransactionSchema()
+
+# Filter query parameters mapped to their converters
+_COERCERS = {
+    'start_date': date.fromisoformat,
+    'end_date': date.fromisoformat,
+    'account_id': int,
+    'category_id': int,
+    'min_amount': float,
+    'max_amount': float,
+    'description': str,
+    'is_reconciled': is_truthy,
+    'category_type': str
+}
 
 # Helper functions
+def _check_references(user_id, account_id=None, category_id=None):
+    """Find which reference made create_transaction's guarded INSERT match nothing
+
+    Only runs on that failure path, after the rollback. Returns the 404 for
+    the first account or category the user does not own, or None if both
+    are valid.
+    """
+    checks = []
+    params = []
+    if account_id is not None:
+        checks.append("EXISTS (SELECT 1 FROM accounts WHERE id = %s AND user_id = %s)")
+        params.extend([account_id, user_id])
+    if category_id is not None:
+        checks.append("EXISTS (SELECT 1 FROM categories WHERE id = %s AND user_id = %s)")
+        params.extend([category_id, user_id])
+    if not checks:
+        return None
+    
+    conn = db.get_db()
+    found = db.fetch_one_tuple(conn, f"SELECT {', '.join(checks)}", params)
+    return reference_error(account_id is None or found[0], category_id is None or found[-1])
+
+# Filter keys mapped to their SQL conditions, in the order they are applied
+_FILTER_CONDITIONS = {
+    'start_date': "t.date >= %s",
+    'end_date': "t.date <= %s",
+    'account_id': "t.account_id = %s",
+    'category_id': "t.category_id = %s",
+    'min_amount': "t.amount >= %s",
+    'max_amount': "t.amount <= %s",
+    # MySQL has no ILIKE; the default utf8mb4 collation already makes LIKE case-insensitive
+    'description': "t.description LIKE %s",
+    'is_reconciled': "t.is_reconciled = %s",
+    'category_type': "c.type = %s"
+}
+
 def build_transaction_filters(filters, user_id):
     """Build SQL WHERE clause for transaction filters"""
-    conditions = ["user_id = %s"]
+    conditions = ["t.user_id = %s"]
     params = [user_id]
     
-    if 'start_date' in filters:
-        conditions.append("date >= %s")
-        params.append(filters['start_date'])
-    if 'end_date' in filters:
-        conditions.append("date <= %s")
-        params.append(filters['end_date'])
-    if 'account_id' in filters:
-        conditions.append("account_id = %s")
-        params.append(filters['account_id'])
-    if 'category_id' in filters:
-        conditions.append("category_id = %s")
-        params.append(filters['category_id'])
-    if 'min_amount' in filters:
-        conditions.append("amount >= %s")
-        params.append(filters['min_amount'])
-    if 'max_amount' in filters:
-        conditions.append("amount <= %s")
-        params.append(filters['max_amount'])
-    if 'description' in filters:
-        conditions.append("description ILIKE %s")
-        params.append(f"%{filters['description']}%")
-    if 'is_reconciled' in filters:
-        conditions.append("is_reconciled = %s")
-        params.append(filters['is_reconciled'])
-    if 'category_type' in filters:
-        conditions.append("categories.type = %s")
-        params.append(filters['category_type'])
+    for key, condition in _FILTER_CONDITIONS.items():
+        if key in filters:
+            value = filters[key]
+            conditions.append(condition)
+            params.append(f"%{value}%" if key == 'description' else value)
     
     return " AND ".join(conditions), params
 
@@ -76,57 +103,67 @@ def get_all_transactions():
     current_user_id = get_jwt_identity()
     
     # Parse filter parameters
-    filter_schema = TransactionFilterParams()
     filter_params = {}
     for key, value in request.args.items():
-        if key in filter_schema.fields:
-            if key in ['start_date', 'end_date']:
-                try:
-                    filter_params[key] = datetime.strptime(value, '%Y-%m-%d').date()
-                except ValueError:
-                    pass
-            elif key in ['account_id', 'category_id']:
-                try:
-                    filter_params[key] = int(value)
-                except ValueError:
-                    pass
-            elif key in ['min_amount', 'max_amount']:
-                try:
-                    filter_params[key] = float(value)
-                except ValueError:
-                    pass
-            elif key == 'is_reconciled':
-                filter_params[key] = value.lower() in ['true', '1', 'yes']
-            else:
-                filter_params[key] = value
+        coerce = _COERCERS.get(key)
+        if coerce is not None:
+            try:
+                filter_params[key] = coerce(value)
+            except ValueError:
+                pass
     
     # Build query with filters
     where_clause, params = build_transaction_filters(filter_params, current_user_id)
     
-    # Add sorting
+    # Add sorting; id breaks ties so every row has a unique position
     sort_by = request.args.get('sort_by', 'date')
-    sort_order = request.args.get('sort_order', 'desc')
+    if sort_by not in _SORT_COLUMNS:
+        sort_by = 'date'
+    sort_column = _SORT_COLUMNS[sort_by]
+    descending = request.args.get('sort_order', 'desc').lower() != 'asc'
+    sort_order = 'DESC' if descending else 'ASC'
     
-    sort_column = {
-        'date': 'transactions.date',
-        'amount': 'transactions.amount',
-        'description': 'transactions.description'
-    }.get(sort_by, 'transactions.date')
+    # Keyset pagination: continue after the (sort value, id) of the last row
+    # seen instead of using OFFSET, so earlier pages are never rescanned
+    cursor = request.args.get('cursor')
+    if cursor:
+        after_value, _, after_id = cursor.rpartition('|')
+        try:
+            after_id = int(after_id)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor"}), 400
+        op = '<' if descending else '>'
+        where_clause += f" AND ({sort_column} {op} %s OR ({sort_column} = %s AND t.id {op} %s))"
+        params.extend([after_value, after_value, after_id])
     
+    limit = request.args.get('limit', _DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, _MAX_PAGE_SIZE))
+    
+    # Fetch one extra row to learn whether another page follows
     query = f"""
         SELECT t.*, c.type as category_type, a.name as account_name, c.name as category_name
         FROM transactions t
         JOIN accounts a ON t.account_id = a.id
         JOIN categories c ON t.category_id = c.id
         WHERE {where_clause}
-        ORDER BY {sort_column} {sort_order}
+        ORDER BY {sort_column} {sort_order}, t.id {sort_order}
+        LIMIT %s
     """
+    params.append(limit + 1)
+    
+    conn = db.get_db()
+    transactions = db.fetch_all(conn, query, params)
     
-    transactions = g.db.fetch_all(query, params)
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        last = transactions[-1]
+        next_cursor = f"{last[sort_by]}|{last['id']}"
     
     return jsonify({
         "transactions": transactions,
-        "count": len(transactions)
+        "count": len(transactions),
+        "next_cursor": next_cursor
     }), 200
 
 @transactions_bp.route('/<int:transaction_id>', methods=['GET'])
@@ -142,7 +179,8 @@ def get_transaction(transaction_id):
         JOIN categories c ON t.category_id = c.id
         WHERE t.id = %s AND t.user_id = %s
     """
-    transaction = g.db.fetch_one(query, [transaction_id, current_user_id])
+    conn = db.get_db()
+    transaction = db.fetch_one(conn, query, [transaction_id, current_user_id])
     
     if not transaction:
         return jsonify({"message": "Transaction not found"}), 404
@@ -151,36 +189,24 @@ def get_transaction(transaction_id):
 
 @transactions_bp.route('/', methods=['POST'])
 @jwt_required()
-def create_transaction():
+@json_body(_TRANSACTION_SCHEMA)
+def create_transaction(data):
     """Create a new transaction"""
     current_user_id = get_jwt_identity()
     
-    # Validate input data
-    schema = TransactionSchema()
-    try:
-        data = schema.load(request.json)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
-    # Verify account exists and belongs to user
-    account_query = "SELECT id FROM accounts WHERE id = %s AND user_id = %s"
-    account = g.db.fetch_one(account_query, [data['account_id'], current_user_id])
-    if not account:
-        return jsonify({"message": "Account not found or does not belong to you"}), 404
-    
-    # Verify category exists and belongs to user
-    category_query = "SELECT id FROM categories WHERE id = %s AND user_id = %s"
-    category = g.db.fetch_one(category_query, [data['category_id'], current_user_id])
-    if not category:
-        return jsonify({"message": "Category not found or does not belong to you"}), 404
+    conn = db.get_db()
     
     # Create new transaction
     try:
+        # The insert only happens when the account and category belong to the
+        # user, so the happy path needs no separate ownership check
         insert_query = """
             INSERT INTO transactions 
             (date, description, amount, account_id, category_id, user_id, notes, is_reconciled)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
+            SELECT %s, %s, %s, %s, %s, %s, %s, %s
+            FROM DUAL
+            WHERE EXISTS (SELECT 1 FROM accounts WHERE id = %s AND user_id = %s)
+            AND EXISTS (SELECT 1 FROM categories WHERE id = %s AND user_id = %s)
         """
         params = [
             data['date'],
@@ -190,15 +216,22 @@ def create_transaction():
             data['category_id'],
             current_user_id,
             data.get('notes'),
-            data.get('is_reconciled', False)
+            data.get('is_reconciled', False),
+            data['account_id'],
+            current_user_id,
+            data['category_id'],
+            current_user_id
         ]
         
-        # Start transaction
-        g.db.begin()
-        
-        # Insert transaction
-        result = g.db.fetch_one(insert_query, params)
-        transaction_id = result['id']
+        # Autocommit is off, so the insert opens the transaction the balance
+        # update joins; MySQL has no RETURNING, the id comes back as lastrowid
+        cursor = db.execute_query(conn, insert_query, params)
+        if cursor.rowcount == 0:
+            conn.rollback()
+            # Only now find out which reference was rejected
+            error = _check_references(current_user_id, account_id=data['account_id'], category_id=data['category_id'])
+            return error or (jsonify({"message": "Account or category not found"}), 404)
+        transaction_id = cursor.lastrowid
         
         # Update account balance
         update_balance_query = """
@@ -206,10 +239,12 @@ def create_transaction():
             SET balance = balance + %s 
             WHERE id = %s
         """
-        g.db.execute(update_balance_query, [data['amount'], data['account_id']])
+        db.execute_query(conn, update_balance_query, [data['amount'], data['account_id']])
         
         # Commit transaction
-        g.db.commit()
+        conn.commit()
+        cache.delete(accounts_key(current_user_id))
+        invalidate_reports(current_user_id)
         
         # Fetch the created transaction
         fetch_query = """
@@ -219,7 +254,7 @@ def create_transaction():
             JOIN categories c ON t.category_id = c.id
             WHERE t.id = %s
         """
-        transaction = g.db.fetch_one(fetch_query, [transaction_id])
+        transaction = db.fetch_one(conn, fetch_query, [transaction_id])
         
         return jsonify({
             "message": "Transaction created successfully",
@@ -227,70 +262,69 @@ def create_transaction():
         }), 201
         
     except Exception as e:
-        g.db.rollback()
+        conn.rollback()
         return jsonify({"message": "Failed to create transaction", "error": str(e)}), 500
 
 @transactions_bp.route('/<int:transaction_id>', methods=['PUT'])
 @jwt_required()
-def update_transaction(transaction_id):
+@json_body(_TRANSACTION_SCHEMA, partial=True)
+def update_transaction(transaction_id, data):
     """Update an existing transaction"""
     current_user_id = get_jwt_identity()
     
-    # Check if transaction exists and belongs to user
-    fetch_query = """
-        SELECT * FROM transactions 
+    # Fetch the transaction and check any new account or category in one
+    # round-trip; the EXISTS columns are only selected when needed. FOR UPDATE
+    # holds the row until commit so concurrent edits cannot reuse the same
+    # old amount for their balance deltas
+    columns = ["account_id", "amount"]
+    params = []
+    if 'account_id' in data:
+        columns.append("EXISTS (SELECT 1 FROM accounts WHERE id = %s AND user_id = %s)")
+        params.extend([data['account_id'], current_user_id])
+    if 'category_id' in data:
+        columns.append("EXISTS (SELECT 1 FROM categories WHERE id = %s AND user_id = %s)")
+        params.extend([data['category_id'], current_user_id])
+    fetch_query = f"""
+        SELECT {', '.join(columns)}
+        FROM transactions
         WHERE id = %s AND user_id = %s
+        FOR UPDATE
     """
-    transaction = g.db.fetch_one(fetch_query, [transaction_id, current_user_id])
-    if not transaction:
+    conn = db.get_db()
+    row = db.fetch_one_tuple(conn, fetch_query, [*params, transaction_id, current_user_id])
+    if not row:
         return jsonify({"message": "Transaction not found"}), 404
     
-    # Validate input data
-    schema = TransactionSchema()
-    try:
-        data = schema.load(request.json, partial=True)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
-    # Check account if provided
-    if 'account_id' in data:
-        account_query = "SELECT id FROM accounts WHERE id = %s AND user_id = %s"
-        account = g.db.fetch_one(account_query, [data['account_id'], current_user_id])
-        if not account:
-            return jsonify({"message": "Account not found or does not belong to you"}), 404
-    
-    # Check category if provided
-    if 'category_id' in data:
-        category_query = "SELECT id FROM categories WHERE id = %s AND user_id = %s"
-        category = g.db.fetch_one(category_query, [data['category_id'], current_user_id])
-        if not category:
-            return jsonify({"message": "Category not found or does not belong to you"}), 404
+    old_account_id, old_amount, *references_found = row
+    if 'account_id' in data and not references_found[0]:
+        return jsonify({"message": "Account not found or does not belong to you"}), 404
+    if 'category_id' in data and not references_found[-1]:
+        return jsonify({"message": "Category not found or does not belong to you"}), 404
     
     try:
-        g.db.begin()
+        # Move the amount between balances as atomic deltas in one UPDATE;
+        # when the account stays the same it applies the difference
+        new_account_id = data.get('account_id', old_account_id)
+        new_amount = data.get('amount', old_amount)
         
-        # If amount is changing, update account balances
-        if 'amount' in data:
-            old_amount = transaction['amount']
-            new_amount = data['amount']
-            amount_diff = new_amount - old_amount
-            
-            # Update old account balance
-            update_old_balance_query = """
-                UPDATE accounts 
-                SET balance = balance - %s 
-                WHERE id = %s
-            """
-            g.db.execute(update_old_balance_query, [old_amount, transaction['account_id']])
-            
-            # Update new account balance if account is changing
-            target_account_id = data.get('account_id', transaction['account_id'])
-            update_new_balance_query = """
+        if new_account_id == old_account_id:
+            if new_amount != old_amount:
+                update_balance_query = """
+                    UPDATE accounts 
+                    SET balance = balance + %s - %s 
+                    WHERE id = %s
+                """
+                db.execute_query(conn, update_balance_query, [new_amount, old_amount, old_account_id])
+        else:
+            update_balance_query = """
                 UPDATE accounts 
-                SET balance = balance + %s 
-                WHERE id = %s
+                SET balance = balance + CASE WHEN id = %s THEN %s ELSE %s END 
+                WHERE id IN (%s, %s)
             """
-            g.db.execute(update_new_balance_query, [new_amount, target_account_id])
+            db.execute_query(
+                conn, update_balance_query,
+                [new_account_id, new_amount, -old_amount, new_account_id, old_account_id]
+            )
         
         # Build update query
         update_fields = []
@@ -307,9 +341,11 @@ def update_transaction(transaction_id):
                 WHERE id = %s AND user_id = %s
             """
             update_params.extend([transaction_id, current_user_id])
-            g.db.execute(update_query, update_params)
+            db.execute_query(conn, update_query, update_params)
         
-        g.db.commit()
+        conn.commit()
+        cache.delete(accounts_key(current_user_id))
+        invalidate_reports(current_user_id)
         
         # Fetch updated transaction
         fetch_updated_query = """
@@ -319,7 +355,7 @@ def update_transaction(transaction_id):
             JOIN categories c ON t.category_id = c.id
             WHERE t.id = %s
         """
-        updated_transaction = g.db.fetch_one(fetch_updated_query, [transaction_id])
+        updated_transaction = db.fetch_one(conn, fetch_updated_query, [transaction_id])
         
         return jsonify({
             "message": "Transaction updated successfully",
@@ -327,7 +363,7 @@ def update_transaction(transaction_id):
         }), 200
         
     except Exception as e:
-        g.db.rollback()
+        conn.rollback()
         return jsonify({"message": "Failed to update transaction", "error": str(e)}), 500
 
 @transactions_bp.route('/<int:transaction_id>', methods=['DELETE'])
@@ -335,37 +371,34 @@ def update_transaction(transaction_id):
 def delete_transaction(transaction_id):
     """Delete a transaction"""
     current_user_id = get_jwt_identity()
-    
-    # Check if transaction exists and belongs to user
-    fetch_query = """
-        SELECT * FROM transactions 
-        WHERE id = %s AND user_id = %s
-    """
-    transaction = g.db.fetch_one(fetch_query, [transaction_id, current_user_id])
-    if not transaction:
-        return jsonify({"message": "Transaction not found"}), 404
+    conn = db.get_db()
     
     try:
-        g.db.begin()
-        
-        # Update account balance
+        # Reverse the amount straight from the transaction row; matching no
+        # row means the transaction does not exist or belongs to someone else
         update_balance_query = """
-            UPDATE accounts 
-            SET balance = balance - %s 
-            WHERE id = %s
+            UPDATE accounts a
+            JOIN transactions t ON t.account_id = a.id
+            SET a.balance = a.balance - t.amount
+            WHERE t.id = %s AND t.user_id = %s
         """
-        g.db.execute(update_balance_query, [transaction['amount'], transaction['account_id']])
+        cursor = db.execute_query(conn, update_balance_query, [transaction_id, current_user_id])
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return jsonify({"message": "Transaction not found"}), 404
         
         # Delete transaction
         delete_query = """
             DELETE FROM transactions 
             WHERE id = %s AND user_id = %s
         """
-        g.db.execute(delete_query, [transaction_id, current_user_id])
+        db.execute_query(conn, delete_query, [transaction_id, current_user_id])
         
-        g.db.commit()
+        conn.commit()
+        cache.delete(accounts_key(current_user_id))
+        invalidate_reports(current_user_id)
         return jsonify({"message": "Transaction deleted successfully"}), 200
         
     except Exception as e:
-        g.db.rollback()
+        conn.rollback()
         return jsonify({"message": "Failed to delete transaction", "error": str(e)}), 500 
\ No newline at end of file
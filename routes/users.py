@@ -1,7 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.user import User
-from marshmallow import Schema, fields, validate, ValidationError
+from utils.database import db
+from utils.cache import cache, access_token_key
+from utils.passwords import hash_password, verify_password, validate_password_bytes
+from marshmallow import Schema, fields, validate
+from sqlalchemy import update
+from utils.validation import json_body
 
 # Create blueprint
 users_bp = Blueprint('users', __name__)
@@ -13,9 +18,12 @@ class UpdateProfileSchema(Schema):
 
 class ChangePasswordSchema(Schema):
     current_password = fields.String(required=True)
-    new_password = fields.String(required=True, validate=validate.Length(min=8))
+    new_password = fields.String(required=True, validate=[validate.Length(min=8), validate_password_bytes])
     confirm_password = fields.String(required=True)
 
+_UPDATE_PROFILE_SCHEMA = UpdateProfileSchema()
+_CHANGE_PASSWORD_SCHEMA = ChangePasswordSchema()
+
 # Route definitions
 @users_bp.route('/profile', methods=['GET'])
 @jwt_required()
@@ -23,7 +31,7 @@ def get_profile():
     """Get user's profile information"""
     current_user_id = get_jwt_identity()
     
-    user = User.query.get(current_user_id)
+    user = db.session.get(User, current_user_id)
     if not user:
         return jsonify({"message": "User not found"}), 404
     
@@ -31,28 +39,24 @@ def get_profile():
 
 @users_bp.route('/profile', methods=['PUT'])
 @jwt_required()
-def update_profile():
+@json_body(_UPDATE_PROFILE_SCHEMA)
+def update_profile(data):
     """Update user's profile information"""
     current_user_id = get_jwt_identity()
     
-    user = User.query.get(current_user_id)
+    user = db.session.get(User, current_user_id)
     if not user:
         return jsonify({"message": "User not found"}), 404
     
-    # Validate input data
-    schema = UpdateProfileSchema()
-    try:
-        data = schema.load(request.json)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
-    # Update user information
-    if 'first_name' in data:
-        user.first_name = data['first_name']
-    if 'last_name' in data:
-        user.last_name = data['last_name']
-    
-    user.save()
+    # Apply the provided fields in a single UPDATE
+    if data:
+        db.session.execute(
+            update(User)
+            .where(User.id == current_user_id)
+            .values(**data)
+            .execution_options(synchronize_session='evaluate')
+        )
+        db.session.commit()
     
     return jsonify({
         "message": "Profile updated successfully",
@@ -61,31 +65,34 @@ def update_profile():
 
 @users_bp.route('/change-password', methods=['POST'])
 @jwt_required()
-def change_password():
+@json_body(_CHANGE_PASSWORD_SCHEMA)
+def change_password(data):
     """Change user's password"""
     current_user_id = get_jwt_identity()
     
-    user = User.query.get(current_user_id)
+    user = db.session.get(User, current_user_id)
     if not user:
         return jsonify({"message": "User not found"}), 404
     
-    # Validate input data
-    schema = ChangePasswordSchema()
-    try:
-        data = schema.load(request.json)
-    except ValidationError as err:
-        return jsonify({"message": "Validation error", "errors": err.messages}), 400
-    
     # Verify current password
-    if not user.check_password(data['current_password']):
+    if not verify_password(user.password_hash, data['current_password']):
         return jsonify({"message": "Current password is incorrect"}), 401
     
     # Check if new password and confirmation match
     if data['new_password'] != data['confirm_password']:
         return jsonify({"message": "New password and confirmation do not match"}), 400
     
-    # Update password
-    user.update_password(data['new_password'])
+    # Update password with the same scheme and cost that login checks against
+    db.session.execute(
+        update(User)
+        .where(User.id == current_user_id)
+        .values(password_hash=hash_password(data['new_password']))
+        .execution_options(synchronize_session='evaluate')
+    )
+    db.session.commit()
+    
+    # Stop handing out the access token issued for the old password
+    cache.delete(access_token_key(current_user_id))
     
     return jsonify({"message": "Password changed successfully"}), 200
 
@@ -95,12 +102,17 @@ def deactivate_account():
     """Deactivate user's account"""
     current_user_id = get_jwt_identity()
     
-    user = User.query.get(current_user_id)
-    if not user:
+    # Deactivate account without loading the user first
+    result = db.session.execute(
+        update(User)
+        .where(User.id == current_user_id)
+        .values(is_active=False)
+    )
+    db.session.commit()
+    if result.rowcount == 0:
         return jsonify({"message": "User not found"}), 404
     
-    # Deactivate account
-    user.is_active = False
-    user.save()
+    # Stop handing out the cached access token
+    cache.delete(access_token_key(current_user_id))
     
     return jsonify({"message": "Account deactivated successfully"}), 200 
\ No newline at end of file
@@ -1,12 +1,41 @@
 import os
 import re
 import tempfile
-from datetime import datetime
 import pandas as pd
 import tabula
 from pdfminer.high_level import extract_text
 from models.pdf_statement import PDFStatement, ProcessingStatus
 
+# Patterns are compiled once at import rather than looked up by string on every call
+_TRANSACTION_RE = re.compile(r'(\d{1,2}/\d{1,2}/\d{2,4})\s+([\w\s\'\-\&\/\.]+?)\s+([-+]?\$?[\d,]+\.\d{2})')
+_AMOUNT_CLEAN_RE = re.compile(r'[^\d\.-]')
+
+# Columns of the extracted transactions frame
+_EXTRACTED_COLUMNS = ['date', 'description', 'amount']
+
+# Date formats tried, in order, for table date columns
+_TABLE_DATE_FORMATS = ('%m/%d/%Y', '%d/%m/%Y', '%Y-%m-%d', '%m-%d-%Y', '%d-%m-%Y')
+
+# Bank-specific patterns
+_BANK_PATTERNS = {
+    'Chase': {
+        'date_pattern': re.compile(r'(\d{2}/\d{2}/\d{2,4})'),
+        'transaction_pattern': re.compile(r'(\d{2}/\d{2}/\d{2,4})\s+([\w\s\'\-\&\/\.]+?)\s+([-+]?\$?[\d,]+\.\d{2})'),
+        'date_format': '%m/%d/%Y'
+    },
+    'Bank of America': {
+        'date_pattern': re.compile(r'(\d{2}/\d{2}/\d{2,4})'),
+        'transaction_pattern': re.compile(r'(\d{2}/\d{2}/\d{2,4})\s+([\w\s\'\-\&\/\.]+?)\s+([-+]?\$?[\d,]+\.\d{2})'),
+        'date_format': '%m/%d/%Y'
+    },
+    'Wells Fargo': {
+        'date_pattern': re.compile(r'(\d{1,2}/\d{1,2}/\d{2,4})'),
+        'transaction_pattern': _TRANSACTION_RE,
+        'date_format': '%m/%d/%Y'
+    },
+    # Add more banks as needed
+}
+
 class PDFProcessor:
     """Service class for processing PDF bank/credit card statements"""
     
@@ -17,27 +46,10 @@ class PDFProcessor:
         
         self.pdf_statement = pdf_statement
         self.file_path = pdf_statement.file_path
-        self.extracted_data = []
+        # One row per transaction, columns as in _EXTRACTED_COLUMNS
+        self.extracted_data = pd.DataFrame(columns=_EXTRACTED_COLUMNS)
         
-        # Bank-specific patterns
-        self.bank_patterns = {
-            'Chase': {
-                'date_pattern': r'(\d{2}/\d{2}/\d{2,4})',
-                'transaction_pattern': r'(\d{2}/\d{2}/\d{2,4})\s+([\w\s\'\-\&\/\.]+?)\s+([-+]?\$?[\d,]+\.\d{2})',
-                'date_format': '%m/%d/%Y'
-            },
-            'Bank of America': {
-                'date_pattern': r'(\d{2}/\d{2}/\d{2,4})',
-                'transaction_pattern': r'(\d{2}/\d{2}/\d{2,4})\s+([\w\s\'\-\&\/\.]+?)\s+([-+]?\$?[\d,]+\.\d{2})',
-                'date_format': '%m/%d/%Y'
-            },
-            'Wells Fargo': {
-                'date_pattern': r'(\d{1,2}/\d{1,2}/\d{2,4})',
-                'transaction_pattern': r'(\d{1,2}/\d{1,2}/\d{2,4})\s+([\w\s\'\-\&\/\.]+?)\s+([-+]?\$?[\d,]+\.\d{2})',
-                'date_format': '%m/%d/%Y'
-            },
-            # Add more banks as needed
-        }
+        self.bank_patterns = _BANK_PATTERNS
     
     def process(self):
         """Process the PDF statement and extract transactions"""
@@ -45,15 +57,12 @@ class PDFProcessor:
             # Update status to processing
             self.pdf_statement.update_processing_status(ProcessingStatus.PROCESSING)
             
-            # First, detect the bank type (if possible)
-            bank_type = self._detect_bank_type()
-            
             # Try to extract data using tabula (table-based approach)
             self._extract_using_tabula()
             
             # If tabula didn't find enough data, try text-based extraction
             if len(self.extracted_data) < 5:  # Arbitrary threshold
-                self._extract_using_text(bank_type)
+                self._extract_using_text()
             
             # Update status to completed
             self.pdf_statement.update_processing_status(ProcessingStatus.COMPLETED)
@@ -65,15 +74,25 @@ class PDFProcessor:
             self.pdf_statement.update_processing_status(ProcessingStatus.FAILED, str(e))
             raise
     
-    def _detect_bank_type(self):
+    def _add_rows(self, transaction_dates, descriptions, amounts):
+        """Append parsed columns to the extracted transactions frame"""
+        rows = pd.DataFrame({
+            'date': transaction_dates.dt.date,
+            'description': descriptions,
+            'amount': amounts.astype(float)
+        })
+        if self.extracted_data.empty:
+            self.extracted_data = rows.reset_index(drop=True)
+        else:
+            self.extracted_data = pd.concat([self.extracted_data, rows], ignore_index=True)
+    
+    def _detect_bank_type(self, first_page_text):
         """Attempt to detect which bank the statement is from"""
         try:
-            # Extract text from the first page only
-            text = extract_text(self.file_path, page_numbers=[0])
-            
             # Check for bank names
+            text = first_page_text.lower()
             for bank_name in self.bank_patterns.keys():
-                if bank_name.lower() in text.lower():
+                if bank_name.lower() in text:
                     return bank_name
             
             # If not found, use the institution from the database record
@@ -132,104 +151,73 @@ class PDFProcessor:
                         if date_index + 1 < len(table.columns):
                             desc_col = table.columns[date_index + 1]
                     
-                    # Process rows
-                    for _, row in table.iterrows():
-                        try:
-                            date_val = row[date_col]
-                            amount_val = row[amount_col]
-                            desc_val = row[desc_col] if desc_col else ""
-                            
-                            # Skip rows with missing data
-                            if pd.isna(date_val) or pd.isna(amount_val):
-                                continue
-                            
-                            # Clean up values
-                            date_str = str(date_val)
-                            amount_str = str(amount_val)
-                            desc_str = str(desc_val) if not pd.isna(desc_val) else "Unknown transaction"
-                            
-                            # Parse date (try common formats)
-                            transaction_date = None
-                            for date_format in ['%m/%d/%Y', '%d/%m/%Y', '%Y-%m-%d', '%m-%d-%Y', '%d-%m-%Y']:
-                                try:
-                                    transaction_date = datetime.strptime(date_str, date_format).date()
-                                    break
-                                except ValueError:
-                                    continue
-                            
-                            # Skip if date couldn't be parsed
-                            if not transaction_date:
-                                continue
-                            
-                            # Parse amount
-                            amount_clean = re.sub(r'[^\d\.-]', '', amount_str)
-                            try:
-                                amount = float(amount_clean)
-                            except ValueError:
-                                continue
-                            
-                            # Add to extracted data
-                            self.extracted_data.append({
-                                'date': transaction_date,
-                                'description': desc_str.strip(),
-                                'amount': amount
-                            })
-                            
-                        except Exception:
-                            # Skip problematic rows
-                            continue
+                    # Process the columns as whole Series instead of row by row,
+                    # skipping rows with a missing or unparseable date or amount
+                    date_strs = table[date_col].astype(str)
+                    transaction_dates = pd.Series(pd.NaT, index=table.index)
+                    for date_format in _TABLE_DATE_FORMATS:
+                        # Earlier formats win, as with the first successful strptime
+                        transaction_dates = transaction_dates.fillna(
+                            pd.to_datetime(date_strs, format=date_format, errors='coerce')
+                        )
+                    
+                    amount_clean = table[amount_col].astype(str).str.replace(_AMOUNT_CLEAN_RE, '', regex=True)
+                    amounts = pd.to_numeric(amount_clean, errors='coerce')
+                    
+                    if desc_col:
+                        descriptions = table[desc_col].astype(str).str.strip()
+                        descriptions[table[desc_col].isna()] = "Unknown transaction"
+                    else:
+                        descriptions = pd.Series("", index=table.index)
+                    
+                    valid = (
+                        table[date_col].notna() & table[amount_col].notna()
+                        & transaction_dates.notna() & amounts.notna()
+                    )
+                    
+                    # Add to extracted data
+                    self._add_rows(transaction_dates[valid], descriptions[valid], amounts[valid])
             
         except Exception as e:
             # Log error but continue to text-based extraction
             print(f"Tabula extraction error: {str(e)}")
     
-    def _extract_using_text(self, bank_type=None):
+    def _extract_using_text(self):
         """Extract transaction data using text-based approach"""
         try:
-            # Extract text from the PDF
+            # Extract text from the PDF once; pdfminer ends each page with a
+            # form feed, so the first page for bank detection is a prefix of it
             text = extract_text(self.file_path)
+            bank_type = self._detect_bank_type(text.split('\f', 1)[0])
             
             # Select the appropriate pattern based on bank type
-            date_pattern = r'(\d{1,2}/\d{1,2}/\d{2,4})'
-            transaction_pattern = r'(\d{1,2}/\d{1,2}/\d{2,4})\s+([\w\s\'\-\&\/\.]+?)\s+([-+]?\$?[\d,]+\.\d{2})'
+            transaction_pattern = _TRANSACTION_RE
             date_format = '%m/%d/%Y'
             
             if bank_type and bank_type in self.bank_patterns:
                 bank_config = self.bank_patterns[bank_type]
-                date_pattern = bank_config['date_pattern']
                 transaction_pattern = bank_config['transaction_pattern']
                 date_format = bank_config['date_format']
             
             # Find transactions using regex pattern
-            transactions = re.findall(transaction_pattern, text)
+            transactions = transaction_pattern.findall(text)
             
-            for transaction in transactions:
-                try:
-                    date_str = transaction[0]
-                    description = transaction[1].strip()
-                    amount_str = transaction[2]
-                    
-                    # Parse date
-                    transaction_date = datetime.strptime(date_str, date_format).date()
-                    
-                    # Parse amount
-                    amount_clean = re.sub(r'[^\d\.-]', '', amount_str)
-                    amount = float(amount_clean)
-                    
-                    # Determine if it's a positive or negative amount
-                    if '-' in amount_str or '(' in amount_str:
-                        amount = -abs(amount)
-                    
-                    # Add to extracted data
-                    self.extracted_data.append({
-                        'date': transaction_date,
-                        'description': description,
-                        'amount': amount
-                    })
-                    
-                except Exception:
-                    # Skip problematic transactions
-                    continue
+            matches = pd.DataFrame(transactions, columns=['date', 'description', 'amount'])
+            
+            # Parse every match at once; rows whose date or amount fails to
+            # parse come back as NaT/NaN and are dropped below
+            transaction_dates = pd.to_datetime(matches['date'], format=date_format, errors='coerce')
+            amount_clean = matches['amount'].str.replace(_AMOUNT_CLEAN_RE, '', regex=True)
+            amounts = pd.to_numeric(amount_clean, errors='coerce')
+            
+            # Determine if it's a positive or negative amount
+            negative = matches['amount'].str.contains('[-(]', regex=True)
+            amounts = amounts.where(~negative, -amounts.abs())
+            
+            valid = transaction_dates.notna() & amounts.notna()
+            
+            # Add to extracted data
+            self._add_rows(transaction_dates[valid], matches['description'][valid].str.strip(), amounts[valid])
             
         except Exception as e:
             # Log error but continue
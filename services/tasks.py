@@ -0,0 +1,23 @@
+"""Background jobs run by RQ workers
+
+Start a worker from the project root with: rq worker --url $REDIS_URL
+"""
+import functools
+from app import create_app
+from services.pdf_processor import PDFProcessor
+from utils.database import db
+
+
+@functools.cache
+def _get_app():
+    """Build the Flask app once per worker process"""
+    return create_app()
+
+
+def process_pdf_statement(statement_id):
+    """Extract transactions from an uploaded statement"""
+    with _get_app().app_context():
+        # False if deleted since it was queued; duplicate jobs are prevented by the job id
+        result = PDFProcessor.process_statement(statement_id, db)
+        # Only report success, so RQ does not pickle the extracted rows into Redis
+        return result is not False
@@ -0,0 +1,41 @@
+"""Report route tests"""
+from decimal import Decimal
+import pytest
+from flask_jwt_extended import create_access_token
+from app import create_app
+from routes import reports
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setenv('FLASK_ENV', 'testing')
+    return create_app('testing')
+
+
+@pytest.fixture
+def auth_headers(app):
+    with app.app_context():
+        token = create_access_token(identity=1)
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_spending_by_category_with_expenses(app, auth_headers, monkeypatch):
+    # PyMySQL returns DECIMAL columns as Decimal
+    rows = [
+        {'id': 1, 'name': 'Groceries', 'color': '#4caf50',
+         'total': Decimal('75.00'), 'grand_total': Decimal('100.00')},
+        {'id': 2, 'name': 'Transport', 'color': '#2196f3',
+         'total': Decimal('25.00'), 'grand_total': Decimal('100.00')},
+    ]
+    monkeypatch.setattr(reports.db, 'fetch_all', lambda query, params: rows)
+    
+    response = app.test_client().get(
+        '/api/reports/spending-by-category?start_date=2023-01-01&end_date=2023-01-31',
+        headers=auth_headers
+    )
+    
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['total'] == 100.0
+    assert [c['amount'] for c in body['categories']] == [75.0, 25.0]
+    assert [c['percentage'] for c in body['categories']] == [75.0, 25.0]
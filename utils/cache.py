@@ -0,0 +1,64 @@
+"""Shared response cache"""
+import functools
+import time
+from flask import current_app, request
+from flask_caching import Cache
+from flask_jwt_extended import get_jwt_identity
+
+cache = Cache()
+
+
+def accounts_key(user_id):
+    """Cache key for a user's active account list"""
+    return f"accounts:{user_id}"
+
+
+def categories_key(user_id, category_type=None):
+    """Cache key for a user's category list, optionally filtered by type"""
+    return f"categories:{user_id}:{category_type or 'all'}"
+
+
+def access_token_key(user_id):
+    """Cache key for a user's reusable access token"""
+    return f"access_token:{user_id}"
+
+
+def reports_version_key(user_id):
+    """Cache key for the version stamp embedded in a user's report keys"""
+    return f"reports_version:{user_id}"
+
+
+def invalidate_reports(user_id):
+    """Invalidate every cached report for a user
+
+    Report keys embed the user's current version stamp, so replacing the
+    stamp orphans all of them at once; they then expire on their own.
+    """
+    cache.set(reports_version_key(user_id), time.time_ns(), timeout=0)
+
+
+def cached_report(timeout=None):
+    """Cache a report view's response per user and query string
+
+    Stores the encoded body, so cache hits skip both the queries and JSON
+    serialization.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = get_jwt_identity()
+            version = cache.get(reports_version_key(user_id))
+            query = sorted(request.args.items(multi=True))
+            cache_key = f"report:{request.path}:{user_id}:{version}:{query}"
+            
+            cached = cache.get(cache_key)
+            if cached is not None:
+                body, status = cached
+                return current_app.response_class(body, status=status, mimetype='application/json')
+            
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                cache.set(cache_key, (response.get_data(), response.status_code), timeout=timeout)
+            return response
+        return wrapper
+    return decorator
@@ -1,12 +1,20 @@
 """Database initialization script to set up tables using raw SQL"""
+import argparse
+import hashlib
+import logging
 import os
 import sys
+import time
+import pymysql
+from pymysql.constants import CLIENT, ER
 from . import db
 from config import get_config
 
-# SQL statements to create tables
+logger = logging.getLogger(__name__)
+
+# Tables in creation order, as (name, CREATE statement) pairs
 CREATE_TABLES = [
-    """
+    ("users", """
     CREATE TABLE IF NOT EXISTS users (
         id INT AUTO_INCREMENT PRIMARY KEY,
         email VARCHAR(255) NOT NULL UNIQUE,
@@ -17,8 +25,8 @@ CREATE_TABLES = [
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
         updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
     );
-    """,
-    """
+    """),
+    ("categories", """
     CREATE TABLE IF NOT EXISTS categories (
         id INT AUTO_INCREMENT PRIMARY KEY,
         name VARCHAR(100) NOT NULL,
@@ -28,10 +36,11 @@ CREATE_TABLES = [
         user_id INT NOT NULL,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
         updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_categories_user_type_name (user_id, type, name),
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
     );
-    """,
-    """
+    """),
+    ("accounts", """
     CREATE TABLE IF NOT EXISTS accounts (
         id INT AUTO_INCREMENT PRIMARY KEY,
         name VARCHAR(100) NOT NULL,
@@ -44,10 +53,11 @@ CREATE_TABLES = [
         user_id INT NOT NULL,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
         updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX ix_accounts_user_active_name (user_id, is_active, name),
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-    );
-    """,
-    """
+    ) ROW_FORMAT=DYNAMIC;
+    """),
+    ("transactions", """
     CREATE TABLE IF NOT EXISTS transactions (
         id INT AUTO_INCREMENT PRIMARY KEY,
         date DATE NOT NULL,
@@ -60,12 +70,16 @@ CREATE_TABLES = [
         user_id INT NOT NULL,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
         updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX ix_tx_user_date (user_id, date, category_id, amount),
+        INDEX ix_tx_user_date_id (user_id, date, id),
+        INDEX ix_tx_account_date (account_id, date),
+        INDEX ix_tx_category_date (category_id, date),
         FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE,
         FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE RESTRICT,
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-    );
-    """,
-    """
+    ) ROW_FORMAT=DYNAMIC;
+    """),
+    ("bills", """
     CREATE TABLE IF NOT EXISTS bills (
         id INT AUTO_INCREMENT PRIMARY KEY,
         name VARCHAR(100) NOT NULL,
@@ -79,12 +93,13 @@ CREATE_TABLES = [
         user_id INT NOT NULL,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
         updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX ix_bills_user_due (user_id, due_date, is_paid),
         FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE RESTRICT,
         FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE SET NULL,
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-    );
-    """,
-    """
+    ) ROW_FORMAT=DYNAMIC;
+    """),
+    ("pdf_statements", """
     CREATE TABLE IF NOT EXISTS pdf_statements (
         id INT AUTO_INCREMENT PRIMARY KEY,
         filename VARCHAR(255) NOT NULL,
@@ -100,31 +115,160 @@ CREATE_TABLES = [
         user_id INT NOT NULL,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
         updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX ix_pdf_user_status (user_id, processing_status),
         FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE,
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-    );
-    """
+    ) ROW_FORMAT=DYNAMIC;
+    """)
+]
+
+# Indexes added to the tables above after they were first released, as
+# (table, index name, ADD clause). New tables get them from CREATE TABLE; these
+# bring tables created by an earlier version up to date
+ADD_INDEXES = [
+    ("categories", "uq_categories_user_type_name", "ADD UNIQUE KEY uq_categories_user_type_name (user_id, type, name)"),
+    ("accounts", "ix_accounts_user_active_name", "ADD INDEX ix_accounts_user_active_name (user_id, is_active, name)"),
+    ("transactions", "ix_tx_user_date", "ADD INDEX ix_tx_user_date (user_id, date, category_id, amount)"),
+    ("transactions", "ix_tx_user_date_id", "ADD INDEX ix_tx_user_date_id (user_id, date, id)"),
+    ("transactions", "ix_tx_account_date", "ADD INDEX ix_tx_account_date (account_id, date)"),
+    ("transactions", "ix_tx_category_date", "ADD INDEX ix_tx_category_date (category_id, date)"),
+    ("bills", "ix_bills_user_due", "ADD INDEX ix_bills_user_due (user_id, due_date, is_paid)"),
+    ("pdf_statements", "ix_pdf_user_status", "ADD INDEX ix_pdf_user_status (user_id, processing_status)")
 ]
 
-def initialize_database():
-    """Initialize database by creating necessary tables"""
-    config = get_config()
-    conn = db.get_connection(config)
+# Every statement ends with ';', so together they form one script
+_CREATE_SCRIPT = "\n".join(table_sql.strip() for _, table_sql in CREATE_TABLES)
+
+# Fingerprint of the schema above, recorded after a successful run so later
+# runs can skip the DDL (and its metadata locks) when nothing has changed
+SCHEMA_HASH = hashlib.sha256(
+    (_CREATE_SCRIPT + "".join(clause for _, _, clause in ADD_INDEXES)).encode('utf-8')
+).hexdigest()
+
+_RECORD_SCHEMA_SQL = f"""
+CREATE TABLE IF NOT EXISTS _schema_meta (
+    id TINYINT PRIMARY KEY,
+    version CHAR(64) NOT NULL
+);
+REPLACE INTO _schema_meta (id, version) VALUES (1, '{SCHEMA_HASH}');
+"""
+
+def _stored_schema_hash(conn):
+    """Get the schema hash recorded by the last successful run, if any"""
+    try:
+        row = db.fetch_one(conn, "SELECT version FROM _schema_meta WHERE id = 1")
+    except pymysql.err.ProgrammingError as e:
+        if e.args[0] == ER.NO_SUCH_TABLE:
+            return None
+        raise
+    return row['version'] if row else None
+
+def _existing_tables(conn):
+    """Get the names of the tables already in the connected database"""
+    rows = db.fetch_all(
+        conn,
+        "SELECT TABLE_NAME AS name FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+    )
+    return {row['name'] for row in rows}
+
+def _existing_indexes(conn):
+    """Get the (table, index name) pairs already in the connected database"""
+    rows = db.fetch_all(
+        conn,
+        """
+        SELECT DISTINCT TABLE_NAME AS table_name, INDEX_NAME AS name
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+        """
+    )
+    return {(row['table_name'], row['name']) for row in rows}
+
+def _add_indexes_sql(existing_tables, existing_indexes, table_names):
+    """Build ALTER statements adding the missing ADD_INDEXES to existing tables
+
+    Indexes on a table are added in one ALTER, built online without blocking
+    reads or writes.
+    """
+    clauses = {}
+    for table, name, clause in ADD_INDEXES:
+        if table in table_names and table in existing_tables and (table, name) not in existing_indexes:
+            clauses.setdefault(table, []).append(clause)
+    return "".join(
+        f"\nALTER TABLE {table} {', '.join(table_clauses)}, ALGORITHM=INPLACE, LOCK=NONE;"
+        for table, table_clauses in clauses.items()
+    )
+
+def initialize_database(only=None):
+    """Initialize database by creating necessary tables
+
+    `only` restricts the run to the named tables; such partial runs neither
+    consult nor record the schema hash.
+    """
+    tables = CREATE_TABLES if only is None else [(name, sql) for name, sql in CREATE_TABLES if name in only]
+    started = time.perf_counter()
+    # get_config returns a class; connections read settings by key like app.config
+    config_class = get_config()
+    config = {key: getattr(config_class, key) for key in dir(config_class) if key.isupper()}
+    conn = db.get_connection(config, client_flag=CLIENT.MULTI_STATEMENTS)
     
     try:
-        # Create tables
-        for table_sql in CREATE_TABLES:
+        if only is None and _stored_schema_hash(conn) == SCHEMA_HASH:
+            logger.info("Database schema is up to date")
+            return
+        
+        # One probe finds every existing table, so only missing ones are
+        # created and existing ones take no metadata locks
+        existing = _existing_tables(conn)
+        missing = [(name, table_sql) for name, table_sql in tables if name not in existing]
+        
+        # Tables that already existed may predate some of their indexes
+        alter_sql = _add_indexes_sql(existing, _existing_indexes(conn), {name for name, _ in tables})
+        
+        # Create the missing tables in order, add missing indexes and record the
+        # schema in a single round-trip
+        script = "\n".join(table_sql.strip() for _, table_sql in missing) + alter_sql
+        if only is None:
+            script += _RECORD_SCHEMA_SQL
+        if script:
             try:
-                db.execute_with_commit(conn, table_sql)
-                table_name = table_sql.strip().split('CREATE TABLE IF NOT EXISTS ')[1].split(' ')[0]
-                print(f"Table {table_name} created or already exists.")
+                db.execute_script(conn, script)
             except Exception as e:
-                print(f"Error creating table: {str(e)}")
+                logger.error("Error creating tables: %s", e)
                 raise
         
-        print("Database initialization complete.")
+        for table_name, _ in tables:
+            logger.debug("Table %s %s", table_name, "already exists" if table_name in existing else "created")
+        
+        logger.info(
+            "Database initialization complete: %d of %d tables created in %.1fms",
+            len(missing), len(tables), (time.perf_counter() - started) * 1000
+        )
     finally:
         conn.close()
 
+def main(argv=None):
+    """Command-line entry point"""
+    table_names = [name for name, _ in CREATE_TABLES]
+    parser = argparse.ArgumentParser(prog="python -m utils.db_init", description=__doc__)
+    parser.add_argument('--print-only', action='store_true',
+                        help="print the DDL and exit without connecting")
+    parser.add_argument('--only', metavar='TABLES',
+                        help=f"comma-separated tables to create (from: {', '.join(table_names)})")
+    args = parser.parse_args(argv)
+    
+    only = None
+    if args.only:
+        only = {name.strip() for name in args.only.split(',') if name.strip()}
+        unknown = only.difference(table_names)
+        if unknown:
+            parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+    
+    if args.print_only:
+        print("\n".join(sql.strip() for name, sql in CREATE_TABLES if only is None or name in only))
+        return
+    
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    initialize_database(only)
+
 if __name__ == "__main__":
-    initialize_database() 
\ No newline at end of file
+    main() 
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""Background job queue"""
+import threading
+from flask import current_app
+from redis import Redis
+from rq import Queue
+from rq.job import JobStatus
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+# Job states in which a statement job will still run or is running
+_PENDING_STATUSES = frozenset((JobStatus.QUEUED, JobStatus.STARTED, JobStatus.DEFERRED, JobStatus.SCHEDULED))
+
+
+def get_queue():
+    """Get the shared job queue for the configured Redis server"""
+    url = current_app.config['REDIS_URL']
+    queue = _queues.get(url)
+    if queue is None:
+        with _queues_lock:
+            queue = _queues.setdefault(url, Queue(connection=Redis.from_url(url)))
+    return queue
+
+
+def enqueue_statement_processing(statement_id):
+    """Queue a PDF statement for processing
+
+    Each statement's job has a fixed id, so a job that is still queued or
+    running is found by RQ rather than by the statement's status column, which
+    stays PROCESSING if a worker dies or the job times out. Returns False if
+    such a job exists and nothing was queued.
+    """
+    queue = get_queue()
+    job_id = f"pdf-statement-{statement_id}"
+    job = queue.fetch_job(job_id)
+    if job is not None and job.get_status() in _PENDING_STATUSES:
+        return False
+    
+    queue.enqueue(
+        'services.tasks.process_pdf_statement', statement_id,
+        job_id=job_id,
+        job_timeout=current_app.config['PDF_JOB_TIMEOUT']
+    )
+    return True
@@ -0,0 +1,49 @@
+"""orjson-backed JSON provider for Flask"""
+import decimal
+import orjson
+from flask.json.provider import JSONProvider
+
+_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj):
+    """Serialize types orjson does not handle natively"""
+    # DECIMAL columns come back from PyMySQL as Decimal; keep them exact
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def iter_json_array(key, rows):
+    """Encode {key: [rows...]} incrementally, one row at a time
+
+    Lets list endpoints stream straight from a database cursor without
+    building the whole payload in memory.
+    """
+    yield b'{' + orjson.dumps(key) + b':['
+    separator = b''
+    for row in rows:
+        yield separator + orjson.dumps(dict(row), default=_default, option=_OPTIONS)
+        separator = b','
+    yield b']}'
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider that encodes with orjson
+
+    orjson serializes date, datetime, UUID and dataclass values natively, so
+    views can return database rows as-is.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=_OPTIONS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=_OPTIONS),
+            mimetype='application/json'
+        )
@@ -0,0 +1,44 @@
+"""Password hashing helpers"""
+import bcrypt
+from flask import current_app
+from marshmallow import ValidationError
+from werkzeug.security import check_password_hash
+
+# Prefixes produced by bcrypt.hashpw
+_BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+# bcrypt silently ignores everything past this many bytes of input
+MAX_PASSWORD_BYTES = 72
+
+
+def fits_bcrypt(password):
+    """Check that bcrypt will hash the whole password"""
+    return len(password.encode('utf-8')) <= MAX_PASSWORD_BYTES
+
+
+def validate_password_bytes(password):
+    """Schema validator rejecting passwords bcrypt would truncate"""
+    if not fits_bcrypt(password):
+        raise ValidationError(f"Password must be at most {MAX_PASSWORD_BYTES} bytes long.")
+
+
+def hash_password(password):
+    """Hash a password with bcrypt using the configured work factor"""
+    salt = bcrypt.gensalt(rounds=current_app.config['BCRYPT_ROUNDS'])
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash"""
+    if password_hash.startswith(_BCRYPT_PREFIXES):
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    # Hashes created with werkzeug before the switch to bcrypt
+    return check_password_hash(password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """Check whether a stored hash should be upgraded to the current work factor"""
+    if not password_hash.startswith(_BCRYPT_PREFIXES):
+        return True
+    # bcrypt hashes look like $2b$12$..., with the cost in the third field
+    return int(password_hash.split('$')[2]) != current_app.config['BCRYPT_ROUNDS']
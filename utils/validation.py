@@ -0,0 +1,45 @@
+"""Request validation helpers"""
+import functools
+from flask import request, jsonify
+from marshmallow import ValidationError
+
+# Query-string values treated as true
+_TRUTHY = frozenset(('true', '1', 'yes'))
+
+
+def json_body(schema, **load_kwargs):
+    """Validate the JSON request body against a schema
+
+    The loaded data is passed to the view as the `data` keyword argument.
+    Malformed or missing bodies and validation errors short-circuit with 400.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            payload = request.get_json(silent=True)
+            if payload is None:
+                return jsonify({"message": "Invalid JSON"}), 400
+            try:
+                data = schema.load(payload, **load_kwargs)
+            except ValidationError as err:
+                return jsonify({"message": "Validation error", "errors": err.messages}), 400
+            return view(*args, data=data, **kwargs)
+        return wrapper
+    return decorator
+
+
+def is_truthy(value):
+    """Interpret a query-string flag"""
+    return value.lower() in _TRUTHY
+
+
+def reference_error(account_found=True, category_found=True):
+    """Build the 404 response for an account or category the user does not own
+
+    Returns None when both references are valid.
+    """
+    if not account_found:
+        return jsonify({"message": "Account not found or does not belong to you"}), 404
+    if not category_found:
+        return jsonify({"message": "Category not found or does not belong to you"}), 404
+    return None